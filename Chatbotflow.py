@@ -1,51 +1,73 @@
 # Template for langgraph based psotgres based sync memory
 
-import os
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 
+from llm_client import build_llm
+from workflow_registry import registry, with_system_message
+
 load_dotenv()
 
 class State(TypedDict):
     message: Annotated[list, add_messages]
 
 class Chatbotflow:
-    def __init__(self):    
+    def __init__(self, llm=None):
         self.checkpointer = None
         self.workflow = None
-        self.llm = AzureChatOpenAI(
-            model="gpt-4o-mini",
-            deployment_name="gpt-4o-mini", 
-            api_key=os.getenv("AZURE_OPENAI_API_KEY_2"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_2"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION_2"),
-        )
+        self._llm = llm
+        # Compiled graphs by id(checkpointer), with the checkpointer kept alive
+        self.compiled_graphs = {}
+
+    @property
+    def llm(self):
+        # Built on first use so importing an app module stays cheap and offline
+        if self._llm is None:
+            self._llm = build_llm()
+        return self._llm
 
     def set_checkpointer(self, checkpointer):
         self.checkpointer = checkpointer
-        self.workflow = self._create_workflow()
+        self.workflow = self.compiled(checkpointer)
+
+    def compiled(self, checkpointer):
+        """The graph compiled against ``checkpointer``, compiled only the first time."""
+        key = id(checkpointer)
+        if key not in self.compiled_graphs:
+            self.compiled_graphs[key] = (checkpointer, self._create_workflow(checkpointer))
+        return self.compiled_graphs[key][1]
 
     async def chatbot(self, state: State):
         try:
-            response = await self.llm.ainvoke(state["message"])
+            # The checkpoint already holds message objects; add_messages converted each one once
+            response = await self.llm.ainvoke(with_system_message(state["message"]))
             return {"message": response}
         except Exception as e:
             return {"message": f"Error occurred: {str(e)}"}
 
-    def _create_workflow(self):
+    @property
+    def stateless_workflow(self):
+        # Same graph compiled without a checkpointer: no checkpoint reads or writes
+        return self.compiled(None)
+
+    def _create_workflow(self, checkpointer):
         graph_builder = StateGraph(State)
         graph_builder.add_node("chatbot", self.chatbot)  # Use instance method
         graph_builder.add_edge(START, "chatbot")
         graph_builder.add_edge("chatbot", END)
         return graph_builder.compile(
-            checkpointer=self.checkpointer
+            checkpointer=checkpointer
         )
     
-    async def ainvoke(self, *args, **kwargs):
+    async def ainvoke(self, *args, stateless=False, **kwargs):
+        """Run the graph; ``stateless=True`` skips the checkpointer for one-shot questions."""
+        if stateless:
+            return await self.stateless_workflow.ainvoke(*args, **kwargs)
         if not self.workflow:
             raise RuntimeError("Workflow has no checkpointer set.")
-        return await self.workflow.ainvoke(*args, **kwargs)
\ No newline at end of file
+        return await self.workflow.ainvoke(*args, **kwargs)
+
+registry.register("chatbotflow", Chatbotflow)
@@ -0,0 +1,99 @@
+"""Bytes per checkpoint and save/load latency for the default and compact checkpoint serializers.
+
+Each thread is seeded with N turns, then one more turn is run (save) and the
+state is read back (load). Checkpoints go to MemorySaver, which serializes
+through the same serde as AsyncPostgresSaver. Pass --postgres-url to include
+database I/O.
+
+Usage:
+    python benchmarks/checkpoint_serde_bench.py --turns 10 50 100 250 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from Chatbotflow import Chatbotflow
+from checkpoint_serde import CompactSerializer
+
+QUESTION = "Can you summarise the quarterly revenue figures by region and explain the variance? "
+ANSWER = ("Revenue grew in most regions. The largest variance comes from EMEA, where currency "
+          "effects and a delayed enterprise deal moved bookings into the next quarter. ") * 3
+
+
+def history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"{QUESTION}{i}", id=str(uuid4())))
+        messages.append(AIMessage(content=f"{ANSWER}{i}", id=str(uuid4())))
+    return messages
+
+
+def serializers():
+    options = [("default", JsonPlusSerializer()), ("compact-zlib", CompactSerializer(compression="zlib"))]
+    try:
+        import zstandard  # noqa: F401
+        options.append(("compact-zstd", CompactSerializer(compression="zstd")))
+    except ImportError:
+        pass
+    return options
+
+
+async def measure(make_saver, serde, turns, repeat):
+    flow = Chatbotflow(llm=FakeListChatModel(responses=[ANSWER]))
+    flow.set_checkpointer(make_saver(serde))
+    messages = history(turns)
+    _, blob = serde.dumps_typed(messages)
+
+    saves, loads = [], []
+    for _ in range(repeat):
+        config = {"configurable": {"thread_id": str(uuid4())}}
+        await flow.workflow.aupdate_state(config, {"message": messages}, as_node="chatbot")
+        started = time.perf_counter()
+        await flow.ainvoke(input={"message": QUESTION}, config=config)
+        saves.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await flow.workflow.aget_state(config)
+        loads.append(time.perf_counter() - started)
+    return len(blob), statistics.median(saves), statistics.median(loads)
+
+
+async def run(args, make_saver):
+    print(f"{'turns':>6} {'serializer':<14} {'bytes':>10} {'save ms':>9} {'load ms':>9}")
+    for turns in args.turns:
+        for name, serde in serializers():
+            size, save, load = await measure(make_saver, serde, turns, args.repeat)
+            print(f"{turns:>6} {name:<14} {size:>10} {save * 1000:>9.2f} {load * 1000:>9.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 250, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--postgres-url")
+    args = parser.parse_args()
+
+    if args.postgres_url:
+        from psycopg_pool import AsyncConnectionPool
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+        async with AsyncConnectionPool(conninfo=args.postgres_url, kwargs={"autocommit": True}) as pool:
+            await AsyncPostgresSaver(pool).setup()
+            await run(args, lambda serde: AsyncPostgresSaver(pool, serde=serde))
+    else:
+        await run(args, lambda serde: MemorySaver(serde=serde))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
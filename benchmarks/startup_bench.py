@@ -0,0 +1,105 @@
+"""Startup-time benchmark: module import time and time-to-first-request.
+
+Usage:
+    python benchmarks/startup_bench.py                  # import timings only
+    python benchmarks/startup_bench.py --serve          # also start uvicorn and poll /health and /ready
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, extra_args=()):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    return elapsed, result.stderr
+
+
+def import_time(module, repeat):
+    baseline = [run_python("pass")[0] for _ in range(repeat)]
+    timings = [run_python(f"import {module}")[0] for _ in range(repeat)]
+    return statistics.median(timings) - statistics.median(baseline), statistics.median(timings)
+
+
+def slowest_imports(module, top):
+    _, stderr = run_python(f"import {module}", extra_args=("-X", "importtime"))
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4).strip()))
+    # Only top-level packages, otherwise every submodule shows up twice
+    rows = [row for row in rows if "." not in row[1]]
+    return sorted(rows, reverse=True)[:top]
+
+
+def wait_for(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def time_to_first_request(module, port, timeout):
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        health = time.perf_counter() - started if wait_for(f"{base}/health", timeout) else None
+        ready = time.perf_counter() - started if wait_for(f"{base}/ready", timeout) else None
+        return health, ready
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    net, total = import_time(args.module, args.repeat)
+    print(f"import {args.module}: {net * 1000:.1f} ms (interpreter + import {total * 1000:.1f} ms, median of {args.repeat})")
+    print("slowest top-level imports (cumulative):")
+    for micros, name in slowest_imports(args.module, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    if args.serve:
+        health, ready = time_to_first_request(args.module, args.port, args.timeout)
+        print(f"time to first request (/health): {'%.2f s' % health if health else 'timed out'}")
+        print(f"time to ready (/ready):          {'%.2f s' % ready if ready else 'timed out'}")
+
+
+if __name__ == "__main__":
+    main()
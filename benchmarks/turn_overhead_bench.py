@@ -0,0 +1,95 @@
+"""Per-turn latency of the served Chatbotflow path, before and after the registry change.
+
+Both columns run a full turn the way app.py serves it: ``ainvoke`` on a
+Chatbotflow whose graph is compiled against a checkpointer, on a thread that
+already holds N turns. The LLM is a fake chat model and the checkpointer is
+MemorySaver, so the time is graph execution plus checkpoint serialization, with
+no network.
+
+  before - BaselineChatbotflow below: the served path before the workflow
+             registry, compiled on every set_checkpointer and calling the LLM
+             without the cached system message
+  after  - Chatbotflow.py in the working tree
+
+Turns of the two variants are interleaved so drift affects both alike.
+
+Usage:
+    python benchmarks/turn_overhead_bench.py --turns 10 50 100 250 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from Chatbotflow import Chatbotflow, State
+
+QUESTION = "Can you summarise the quarterly revenue figures by region? "
+ANSWER = "Revenue grew in most regions, with the largest variance in EMEA. "
+
+
+class BaselineChatbotflow(Chatbotflow):
+    """Chatbotflow as served before the registry: per-turn work as it was then."""
+
+    def set_checkpointer(self, checkpointer):
+        self.checkpointer = checkpointer
+        self.workflow = self._create_workflow(checkpointer)
+
+    async def chatbot(self, state: State):
+        try:
+            response = await self.llm.ainvoke(state["message"])
+            return {"message": response}
+        except Exception as e:
+            return {"message": f"Error occurred: {str(e)}"}
+
+
+def history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"{QUESTION}{i}"))
+        messages.append(AIMessage(content=f"{ANSWER}{i}"))
+    return messages
+
+
+async def one_turn(flow, messages):
+    config = {"configurable": {"thread_id": str(uuid4())}}
+    await flow.workflow.aupdate_state(config, {"message": messages}, as_node="chatbot")
+    started = time.perf_counter()
+    await flow.ainvoke(input={"message": QUESTION}, config=config)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 100, 250, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    flows = {}
+    for name, cls in (("before", BaselineChatbotflow), ("after", Chatbotflow)):
+        flow = cls(llm=FakeListChatModel(responses=[ANSWER]))
+        flow.set_checkpointer(MemorySaver())
+        flows[name] = flow
+
+    print(f"{'turns':>6} {'before ms':>10} {'after ms':>9}")
+    for turns in args.turns:
+        messages = history(turns)
+        timings = {name: [] for name in flows}
+        for _ in range(args.repeat):
+            for name, flow in flows.items():
+                timings[name].append(await one_turn(flow, messages))
+        before, after = (statistics.median(timings[name]) * 1000 for name in flows)
+        print(f"{turns:>6} {before:>10.2f} {after:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
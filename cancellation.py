@@ -0,0 +1,98 @@
+# Cancel in-flight graph runs when the HTTP client disconnects.
+#
+# The graph run is awaited as a task while the request is polled for an
+# http.disconnect. On disconnect the task is cancelled, which also aborts the
+# Azure OpenAI HTTP request, and the half-finished turn is settled according to
+# CANCELLED_TURN_POLICY:
+#   discard    - remove the unanswered question from the checkpoint (default)
+#   checkpoint - keep the question and record a placeholder answer
+
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+
+logger = logging.getLogger(__name__)
+
+CANCELLED_TURN_POLICY = os.getenv("CANCELLED_TURN_POLICY", "discard")
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.25"))
+CANCELLED_ANSWER = "[cancelled: client disconnected before the answer was ready]"
+
+_counters = {
+    "cancelled_turns": 0,
+    "estimated_completion_tokens_saved": 0,
+    "completed_turns": 0,
+    "completion_tokens": 0,
+}
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def record_completion(message: Any):
+    """Track completion tokens of finished turns to estimate what a cancellation saves."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    _counters["completed_turns"] += 1
+    _counters["completion_tokens"] += usage.get("output_tokens", 0)
+
+
+def _average_completion_tokens() -> int:
+    if not _counters["completed_turns"]:
+        return 0
+    return round(_counters["completion_tokens"] / _counters["completed_turns"])
+
+
+async def run_until_disconnected(request, awaitable: Awaitable) -> Any:
+    """Await ``awaitable``, cancelling it and raising ClientDisconnected if the client goes away."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                _counters["cancelled_turns"] += 1
+                _counters["estimated_completion_tokens_saved"] += _average_completion_tokens()
+                raise ClientDisconnected()
+    finally:
+        # The endpoint itself was cancelled (e.g. worker shutdown): take the run with it
+        if not task.done():
+            task.cancel()
+
+
+async def settle_cancelled_turn(flow, config: Dict[str, Any], question: str,
+                                policy: Optional[str] = None) -> bool:
+    """Fix up the checkpoint after a cancelled run of ``flow`` (a Chatbotflow).
+
+    LangGraph saves the input checkpoint, with the new question, before the
+    chatbot node runs. Returns True if a placeholder answer was recorded.
+    """
+    policy = policy or CANCELLED_TURN_POLICY
+    if flow.workflow is None:
+        return False
+    state = await flow.workflow.aget_state(config)
+    messages = state.values.get("message", []) if state and state.values else []
+    if not messages or not isinstance(messages[-1], HumanMessage) or messages[-1].content != question:
+        return False
+    if policy == "checkpoint":
+        update = {"message": AIMessage(content=CANCELLED_ANSWER)}
+    else:
+        update = {"message": [RemoveMessage(id=messages[-1].id)]}
+    await flow.workflow.aupdate_state(config, update, as_node="chatbot")
+    return policy == "checkpoint"
+
+
+def get_stats() -> Dict[str, Any]:
+    return {
+        **_counters,
+        "policy": CANCELLED_TURN_POLICY,
+        "average_completion_tokens": _average_completion_tokens(),
+    }
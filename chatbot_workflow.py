@@ -1,11 +1,18 @@
-from typing import TypedDict, Dict, Any, List
+from typing import TYPE_CHECKING, TypedDict, Dict, Any, List, Annotated
 from langgraph.graph import StateGraph, END
-from langchain_openai import AzureChatOpenAI
-import os
+from langgraph.graph.message import add_messages
+from langchain_core.messages import AIMessage
 import json
 
+from llm_client import build_llm
+from workflow_registry import registry, with_system_message
+
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+
 class ChatState(TypedDict):
-    messages: List[Dict[str, str]]
+    # add_messages turns role dicts into message objects once, as they are appended
+    messages: Annotated[List, add_messages]
     error: bool
 
 class ChatbotWorkflow:
@@ -13,15 +20,8 @@ class ChatbotWorkflow:
         self.llm = self._initialize_llm()
         self.workflow = self._create_workflow()
 
-    def _initialize_llm(self) -> AzureChatOpenAI:
-        return AzureChatOpenAI(
-            model="gpt-4o-mini",
-            deployment_name="gpt-4o-mini",
-            api_key=os.getenv("AZURE_OPENAI_API_KEY_2"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_2"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION_2"),
-            temperature=0.7,
-        )
+    def _initialize_llm(self) -> "AzureChatOpenAI":
+        return build_llm(temperature=0.7)
 
     def _create_workflow(self):
         workflow = StateGraph(ChatState)
@@ -32,21 +32,15 @@ class ChatbotWorkflow:
 
     async def process_message(self, state: ChatState) -> ChatState:
         try:
-            messages = state.get("messages", [])
-            response = await self.llm.ainvoke(messages)
-            
-            messages.append({
-                "role": "assistant",
-                "content": response.content
-            })
+            response = await self.llm.ainvoke(with_system_message(state.get("messages", [])))
             
+            # Only the new message; the reducer appends it
             return {
-                "messages": messages,
+                "messages": [AIMessage(content=response.content)],
                 "error": False
             }
         except Exception as e:
             return {
-                "messages": messages,
                 "error": True
             }
 
@@ -63,4 +57,6 @@ class ChatbotWorkflow:
             "error": False
         })
         
-        return state
\ No newline at end of file
+        return state
+
+registry.register("chatbot_workflow", ChatbotWorkflow)
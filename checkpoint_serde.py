@@ -0,0 +1,111 @@
+# Compact, compressed checkpoint serialization for the Chatbotflow checkpointer.
+#
+# Wraps LangGraph's JsonPlusSerializer (msgpack encoding) and compresses values
+# above a size threshold. The codec is recorded in the type tag, e.g.
+# "msgpack+zstd", so blobs written before compression was enabled (plain
+# "msgpack"/"json" tags) still load unchanged.
+
+import os
+import zlib
+import logging
+from typing import Any, Optional, Tuple
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "zstd")  # zstd | zlib | none
+CHECKPOINT_COMPRESSION_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESSION_MIN_BYTES", "1024"))
+CHECKPOINT_COMPRESSION_LEVEL = int(os.getenv("CHECKPOINT_COMPRESSION_LEVEL", "3"))
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        import zstandard
+        self.zstandard = zstandard
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return self.zstandard.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.zstandard.decompress(data)
+
+
+def _make_codec(name: str, level: int):
+    if name == "zstd":
+        try:
+            return ZstdCodec(level)
+        except ImportError:
+            logger.warning("CHECKPOINT_COMPRESSION=zstd but 'zstandard' is not installed, using zlib")
+            return ZlibCodec(level)
+    if name == "zlib":
+        return ZlibCodec(level)
+    return None
+
+
+class CompactSerializer(SerializerProtocol):
+    """Checkpoint serializer that compresses large values and reads both old and new blobs."""
+
+    def __init__(
+        self,
+        inner: Optional[SerializerProtocol] = None,
+        compression: str = CHECKPOINT_COMPRESSION,
+        min_bytes: int = CHECKPOINT_COMPRESSION_MIN_BYTES,
+        level: int = CHECKPOINT_COMPRESSION_LEVEL,
+    ):
+        self.inner = inner or JsonPlusSerializer()
+        self.codec = _make_codec(compression, level)
+        self.min_bytes = min_bytes
+        # Decoding must work for every codec we may have written, whatever is configured now
+        self._decoders = {}
+
+    def _decoder(self, name: str):
+        if name not in self._decoders:
+            # No fallback here: a zstd blob can only be read with zstandard installed
+            codec_class = ZstdCodec if name == "zstd" else ZlibCodec
+            self._decoders[name] = codec_class(CHECKPOINT_COMPRESSION_LEVEL)
+        return self._decoders[name]
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if self.codec is None or len(data) < self.min_bytes:
+            return type_, data
+        compressed = self.codec.compress(data)
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}+{self.codec.name}", compressed
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        base_type, sep, codec_name = type_.rpartition("+")
+        if sep and codec_name in ("zstd", "zlib"):
+            payload = self._decoder(codec_name).decompress(payload)
+            type_ = base_type
+        return self.inner.loads_typed((type_, payload))
+
+
+def build_serializer() -> SerializerProtocol:
+    return CompactSerializer()
@@ -0,0 +1,259 @@
+# Streaming bulk export of user_sessions as CSV, JSONL or Parquet.
+#
+# Rows are read through a server-side cursor (or COPY TO for CSV) and written
+# batch by batch, so memory use does not grow with the size of the export.
+# With several shards, one cursor per shard is merged on timestamp.
+#
+# The HTTP endpoint hands out every user's conversations, so it only answers
+# clients that send ``X-Export-Token: <EXPORT_TOKEN>``; without EXPORT_TOKEN it
+# is disabled. The CLI reads the databases directly and needs no token.
+
+import os
+import csv
+import io
+import hmac
+import json
+import heapq
+import argparse
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import Boolean, DateTime, text
+
+EXPORT_COLUMNS = ["id", "user_id", "thread_id", "question", "ai_answer", "error", "timestamp"]
+BATCH_SIZE = 5000
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def is_trusted(token: Optional[str]) -> bool:
+    return bool(EXPORT_TOKEN) and token is not None and hmac.compare_digest(token, EXPORT_TOKEN)
+
+
+# CSV is formatted the same whichever path writes it: ISO timestamps with
+# microseconds and lowercase booleans. COPY formats on the server, so it selects
+# these expressions instead of the raw columns.
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+COPY_CSV_COLUMNS = [
+    "id", "user_id", "thread_id", "question", "ai_answer",
+    "CASE WHEN error THEN 'true' WHEN NOT error THEN 'false' END AS error",
+    "to_char(timestamp, 'YYYY-MM-DD\"T\"HH24:MI:SS.US') AS timestamp",
+]
+
+
+def build_query(user_id: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                columns=EXPORT_COLUMNS):
+    conditions = []
+    params = {}
+    if user_id:
+        conditions.append("user_id = :user_id")
+        params["user_id"] = user_id
+    if since:
+        conditions.append("timestamp >= :since")
+        params["since"] = since
+    if until:
+        conditions.append("timestamp < :until")
+        params["until"] = until
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Qualified, so a formatted ``timestamp`` output column is not what gets sorted
+    sql = f"SELECT {', '.join(columns)} FROM user_sessions{where} ORDER BY user_sessions.timestamp"
+    return sql, params
+
+
+def iter_batches(engine, user_id=None, since=None, until=None, batch_size: int = BATCH_SIZE) -> Iterator[list]:
+    sql, params = build_query(user_id, since, until)
+    with engine.connect() as connection:
+        # Typed columns so drivers without native types (SQLite) still yield datetimes and bools
+        statement = text(sql).columns(error=Boolean, timestamp=DateTime)
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+            statement, params
+        )
+        for partition in result.partitions():
+            yield partition
+
+
+def iter_merged_batches(engines, user_id=None, since=None, until=None,
+                        batch_size: int = BATCH_SIZE) -> Iterator[list]:
+    def rows(engine):
+        for batch in iter_batches(engine, user_id, since, until, batch_size):
+            yield from batch
+
+    timestamp = EXPORT_COLUMNS.index("timestamp")
+    merged = heapq.merge(*(rows(engine) for engine in engines),
+                         key=lambda row: row[timestamp] or datetime.min)
+    batch = []
+    for row in merged:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_csv(engine, user_id=None, since=None, until=None) -> Iterator[bytes]:
+    # COPY keeps formatting on the server; parameters are bound client side by psycopg
+    sql, params = build_query(user_id, since, until, COPY_CSV_COLUMNS)
+    sql = sql.replace(":user_id", "%(user_id)s").replace(":since", "%(since)s").replace(":until", "%(until)s")
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        with cursor.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT CSV, HEADER)", params or None) as copy:
+            for data in copy:
+                yield bytes(data)
+    finally:
+        connection.close()
+
+
+def _supports_copy(engine) -> bool:
+    return engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg"
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _format_csv_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.strftime(CSV_TIMESTAMP_FORMAT)
+    return value
+
+
+def write_csv(batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows([_format_csv_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_jsonl(batches) -> Iterator[bytes]:
+    for batch in batches:
+        lines = [
+            json.dumps({column: _format_value(value) for column, value in zip(EXPORT_COLUMNS, row)})
+            for row in batch
+        ]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_parquet(batches) -> Iterator[bytes]:
+    try:
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pandas and pyarrow") from e
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("thread_id", pa.string()),
+        ("question", pa.string()),
+        ("ai_answer", pa.string()),
+        ("error", pa.bool_()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        # One row group per batch
+        for batch in batches:
+            frame = pd.DataFrame.from_records(batch, columns=EXPORT_COLUMNS)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+}
+
+
+def export_sessions(engines, fmt: str = "csv", user_id=None, since=None, until=None,
+                    batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Yield the encoded export of ``user_sessions`` in chunks.
+
+    ``engines`` is one engine or a list of shard engines.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not isinstance(engines, (list, tuple)):
+        engines = [engines]
+    if len(engines) == 1:
+        if fmt == "csv" and _supports_copy(engines[0]):
+            return _copy_csv(engines[0], user_id, since, until)
+        return WRITERS[fmt](iter_batches(engines[0], user_id, since, until, batch_size))
+    return WRITERS[fmt](iter_merged_batches(engines, user_id, since, until, batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export user_sessions to a local file")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--user-id")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from app import router
+
+    written = 0
+    engines = [shard.engine for shard in router.all()]
+    with open(args.output, "wb") as f:
+        for chunk in export_sessions(engines, args.format, args.user_id, args.since, args.until,
+                                     args.batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    print(f"Wrote {written} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# Idempotency keys: absorb client retries without re-running the chat turn.
+#
+# The first request with a key runs the turn. Concurrent duplicates on the same
+# worker attach to that run (single-flight), duplicates on other workers wait
+# for the stored response, and later duplicates get the stored response back.
+# Completed keys live in Postgres for IDEMPOTENCY_TTL_SECONDS.
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+# How long a duplicate waits for a run owned by another worker
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+# An in-progress claim older than this is treated as abandoned (crashed worker)
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+PURGE_EVERY = 100
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+Base = declarative_base()
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=IN_PROGRESS)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class IdempotencyError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, session_factory, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+                 max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.session_factory = session_factory
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_keys = max_keys
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._claims = 0
+        self.counters = {"executed": 0, "replayed": 0, "joined_in_flight": 0, "conflicts": 0}
+
+    # Database helpers (run in a thread)
+    def _claim(self, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+        """Insert an in-progress row. Returns None when claimed, else the existing row."""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            db.add(IdempotencyKey(
+                key=key,
+                request_hash=request_hash,
+                status=IN_PROGRESS,
+                created_at=now,
+                expires_at=now + self.ttl,
+            ))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            row = db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+            if row is None:
+                return {"status": None}
+            abandoned = (
+                row.status == IN_PROGRESS
+                and row.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+            )
+            if row.expires_at < now or abandoned:
+                db.delete(row)
+                db.commit()
+                return {"status": None}
+            return {"status": row.status, "request_hash": row.request_hash, "response": row.response}
+        finally:
+            db.close()
+
+    def _complete(self, key: str, response: Any):
+        db = self.session_factory()
+        try:
+            db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update({
+                "status": COMPLETED,
+                "response": json.dumps(response),
+            })
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, key: str):
+        db = self.session_factory()
+        try:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key, IdempotencyKey.status == IN_PROGRESS
+            ).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge(self):
+        db = self.session_factory()
+        try:
+            db.query(IdempotencyKey).filter(IdempotencyKey.expires_at < datetime.utcnow()).delete()
+            overflow = db.query(IdempotencyKey).count() - self.max_keys
+            if overflow > 0:
+                oldest = db.query(IdempotencyKey.key).order_by(IdempotencyKey.created_at).limit(overflow)
+                db.query(IdempotencyKey).filter(IdempotencyKey.key.in_(oldest.scalar_subquery())).delete(
+                    synchronize_session=False
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _wait_for_other_worker(self, key: str, request_hash: str):
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.1
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+            # Re-claiming also picks the key up if the other run failed and released it
+            row = await asyncio.to_thread(self._claim, key, request_hash)
+            if row is None or row["status"] != IN_PROGRESS:
+                return row
+        raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+
+    async def run(self, key: str, request_hash: str,
+                  func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run ``func`` once per key. Returns ``(response, replayed)``."""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != request_hash:
+                self.counters["conflicts"] += 1
+                raise IdempotencyError(422, "Idempotency-Key was reused with a different request")
+            self.counters["joined_in_flight"] += 1
+            return await asyncio.shield(inflight[1]), True
+
+        # Register before touching the database so same-worker duplicates join this run
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request_hash, future)
+        try:
+            response, replayed = await self._claim_and_run(key, request_hash, func)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so an unjoined failure does not log "never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(response)
+            return response, replayed
+        finally:
+            self._inflight.pop(key, None)
+            self._claims += 1
+            if self._claims % PURGE_EVERY == 0:
+                try:
+                    await asyncio.to_thread(self._purge)
+                except Exception as e:
+                    logger.warning(f"Idempotency key purge failed: {e}")
+
+    async def _claim_and_run(self, key: str, request_hash: str,
+                             func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        while True:
+            row = await asyncio.to_thread(self._claim, key, request_hash)
+            if row is not None and row["status"] is not None and row["request_hash"] != request_hash:
+                self.counters["conflicts"] += 1
+                raise IdempotencyError(422, "Idempotency-Key was reused with a different request")
+            if row is not None and row["status"] == IN_PROGRESS:
+                row = await self._wait_for_other_worker(key, request_hash)
+            if row is None:
+                break
+            if row["status"] is None:
+                continue
+            self.counters["replayed"] += 1
+            return json.loads(row["response"]), True
+
+        try:
+            response = await func()
+        except BaseException:
+            await asyncio.to_thread(self._release, key)
+            raise
+        await asyncio.to_thread(self._complete, key, response)
+        self.counters["executed"] += 1
+        return response, False
@@ -0,0 +1,345 @@
+# Asynchronous job mode for chat turns: bounded in-process worker pool,
+# job state in Postgres so any worker can serve the result.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import Column, String, Text, DateTime, Index, and_, or_
+from sqlalchemy.orm import declarative_base
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "200"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# Queued or running jobs older than this were lost by a stopped or crashed worker
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_REAP_INTERVAL = float(os.getenv("JOB_REAP_INTERVAL", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+Base = declarative_base()
+
+
+class ChatJob(Base):
+    __tablename__ = "chat_jobs"
+    job_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    thread_id = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default=QUEUED)
+    ai_answer = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_chat_jobs_status_created_at", "status", "created_at"),)
+
+
+def job_to_dict(job: ChatJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.job_id,
+        "user_id": job.user_id,
+        "thread_id": job.thread_id,
+        "question": job.question,
+        "status": job.status,
+        "ai_answer": job.ai_answer,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobWorkerPool:
+    """Runs submitted chat turns on a fixed number of asyncio workers.
+
+    ``handler`` receives the job as a dict and returns the AI answer. Job rows
+    are written through ``session_factory`` in a thread so the event loop is
+    never blocked on the synchronous engine.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Awaitable[str]],
+        session_factory,
+        workers: int = JOB_WORKERS,
+        max_queue: int = JOB_QUEUE_SIZE,
+        stale_seconds: float = JOB_STALE_SECONDS,
+        reap_interval: float = JOB_REAP_INTERVAL,
+    ):
+        self.handler = handler
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self.stale_seconds = stale_seconds
+        self.reap_interval = reap_interval
+        self._done_events: Dict[str, asyncio.Event] = {}
+        # Queue slots held by submissions whose row is still being inserted
+        self._reserved = 0
+        self._active: set = set()
+        self._running = 0
+        self._counters = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "expired": 0, "skipped": 0}
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+
+    async def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self):
+        # Queued and running jobs of this worker; failed below so pollers get an answer
+        abandoned = list(self._active)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self._active.clear()
+        if abandoned:
+            try:
+                await asyncio.to_thread(self._fail_unfinished, abandoned, "Worker stopped before the job finished")
+            except Exception as e:
+                logger.error(f"Could not fail {len(abandoned)} abandoned job(s): {e}")
+        for job_id in abandoned:
+            event = self._done_events.pop(job_id, None)
+            if event:
+                event.set()
+
+    # Database helpers (run in a thread)
+    def _insert(self, job: Dict[str, Any]):
+        db = self.session_factory()
+        try:
+            db.add(ChatJob(**job))
+            db.commit()
+        finally:
+            db.close()
+
+    def _transition(self, job_id: str, from_status: str, **values) -> bool:
+        """Update the job only if it is still in ``from_status``; False if another worker moved it."""
+        db = self.session_factory()
+        try:
+            updated = db.query(ChatJob).filter(
+                ChatJob.job_id == job_id,
+                ChatJob.status == from_status,
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return updated == 1
+        finally:
+            db.close()
+
+    def _fail_unfinished(self, job_ids, error: str):
+        db = self.session_factory()
+        try:
+            db.query(ChatJob).filter(
+                ChatJob.job_id.in_(job_ids),
+                ChatJob.status.in_((QUEUED, RUNNING)),
+            ).update({"status": FAILED, "error": error, "finished_at": datetime.utcnow()},
+                     synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _expire_stale(self, active) -> int:
+        """Fail queued/running jobs past ``stale_seconds``, left behind by a stopped or crashed worker."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        db = self.session_factory()
+        try:
+            query = db.query(ChatJob).filter(or_(
+                and_(ChatJob.status == QUEUED, ChatJob.created_at < cutoff),
+                and_(ChatJob.status == RUNNING, ChatJob.started_at < cutoff),
+            ))
+            # Never expire a job this worker still holds
+            if active:
+                query = query.filter(ChatJob.job_id.notin_(active))
+            expired = query.update(
+                {"status": FAILED, "error": "Job expired before it finished", "finished_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+            db.commit()
+            return expired
+        finally:
+            db.close()
+
+    async def _reaper(self):
+        while True:
+            try:
+                expired = await asyncio.to_thread(self._expire_stale, list(self._active))
+                if expired:
+                    self._counters["expired"] += expired
+                    logger.warning(f"Expired {expired} stale job(s)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stale job reaper failed: {e}")
+            await asyncio.sleep(self.reap_interval)
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            job = db.query(ChatJob).filter(ChatJob.job_id == job_id).first()
+            return job_to_dict(job) if job else None
+        finally:
+            db.close()
+
+    async def submit(self, user_id: str, thread_id: str, question: str) -> Dict[str, Any]:
+        # Reserve the slot before awaiting the insert, so concurrent submissions
+        # cannot all pass the check and then overflow the queue
+        if self.queue.qsize() + self._reserved >= self.queue.maxsize:
+            self._counters["rejected"] += 1
+            raise QueueFullError("Job queue is full")
+        self._reserved += 1
+        job = {
+            "job_id": str(uuid4()),
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "question": question,
+            "status": QUEUED,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            await asyncio.to_thread(self._insert, job)
+        finally:
+            self._reserved -= 1
+        self._done_events[job["job_id"]] = asyncio.Event()
+        self._active.add(job["job_id"])
+        self.queue.put_nowait((job, time.perf_counter()))
+        self._counters["submitted"] += 1
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            job, enqueued_at = await self.queue.get()
+            started = time.perf_counter()
+            self._wait_times.append(started - enqueued_at)
+            self._running += 1
+            try:
+                # Claim the job; another worker's reaper may have expired it while it waited
+                claimed = await asyncio.to_thread(
+                    self._transition, job["job_id"], QUEUED, status=RUNNING, started_at=datetime.utcnow()
+                )
+                if not claimed:
+                    logger.warning(f"Job {job['job_id']} is no longer queued, skipping it")
+                    self._counters["skipped"] += 1
+                    continue
+                ai_answer = await self.handler(job)
+                # Never move a job out of a terminal state pollers may already have seen
+                finished = await asyncio.to_thread(
+                    self._transition,
+                    job["job_id"],
+                    RUNNING,
+                    status=SUCCEEDED,
+                    ai_answer=ai_answer,
+                    finished_at=datetime.utcnow(),
+                )
+                if finished:
+                    self._counters["succeeded"] += 1
+                else:
+                    logger.warning(f"Job {job['job_id']} expired while running, its answer was not recorded")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} failed: {e}")
+                self._counters["failed"] += 1
+                try:
+                    await asyncio.to_thread(
+                        self._transition,
+                        job["job_id"],
+                        RUNNING,
+                        status=FAILED,
+                        error=str(e),
+                        finished_at=datetime.utcnow(),
+                    )
+                except Exception as db_error:
+                    logger.error(f"Could not record failure for job {job['job_id']}: {db_error}")
+            finally:
+                self._running -= 1
+                self._run_times.append(time.perf_counter() - started)
+                self._active.discard(job["job_id"])
+                event = self._done_events.pop(job["job_id"], None)
+                if event:
+                    event.set()
+                self.queue.task_done()
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Return the job, long-polling up to ``wait`` seconds for a terminal state.
+
+        Jobs submitted to this worker are awaited on an in-process event; jobs
+        owned by another worker are polled from the table.
+        """
+        job = await asyncio.to_thread(self._load, job_id)
+        if job is None or job["status"] in TERMINAL_STATES or wait <= 0:
+            return job
+
+        event = self._done_events.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            return await asyncio.to_thread(self._load, job_id)
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            job = await asyncio.to_thread(self._load, job_id)
+            if job is None or job["status"] in TERMINAL_STATES:
+                break
+        return job
+
+    async def events(self, job_id: str, timeout: float = 300):
+        """Yield server-sent events for each status change until the job finishes."""
+        last_status = None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = await self.get(job_id, wait=min(15.0, max(deadline - time.monotonic(), 0)))
+            if job is None:
+                yield "event: error\ndata: job not found\n\n"
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                payload = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in job.items()}
+                yield f"event: {last_status}\ndata: {json.dumps(payload)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if last_status in TERMINAL_STATES:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "queue_reserved": self._reserved,
+            "queue_capacity": self.queue.maxsize,
+            "running": self._running,
+            "wait_time_avg_s": _avg(self._wait_times),
+            "wait_time_max_s": max(self._wait_times, default=None),
+            "run_time_avg_s": _avg(self._run_times),
+            "run_time_max_s": max(self._run_times, default=None),
+        }
+
+
+def _avg(values) -> Optional[float]:
+    return round(sum(values) / len(values), 4) if values else None
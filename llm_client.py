@@ -0,0 +1,144 @@
+# Shared, pre-warmed async HTTP client for Azure OpenAI
+
+import os
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (per worker process)
+MAX_CONNECTIONS = int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("AZURE_OPENAI_HTTP2", "false").lower() in ("1", "true", "yes")
+WARM_CONNECTIONS = int(os.getenv("AZURE_OPENAI_WARM_CONNECTIONS", "2"))
+REQUEST_TIMEOUT = float(os.getenv("AZURE_OPENAI_REQUEST_TIMEOUT", "60"))
+
+_client: Optional[httpx.AsyncClient] = None
+# requests and new_connections count chat traffic only; warm-up requests and the
+# connections they open are kept apart so they do not count as reuse.
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+    "warm_up_requests": 0,
+    "warmed_connections": 0,
+    "http2": False,
+}
+
+
+async def _trace(event_name: str, info: Dict[str, Any]):
+    # httpcore only emits connect events when it has to open a new connection,
+    # every other request on the pool is a reuse.
+    if event_name == "connection.connect_tcp.complete":
+        _stats["new_connections"] += 1
+
+
+async def _trace_warm_up(event_name: str, info: Dict[str, Any]):
+    if event_name == "connection.connect_tcp.complete":
+        _stats["warmed_connections"] += 1
+
+
+async def _on_request(request: httpx.Request):
+    if request.extensions.get("warm_up"):
+        _stats["warm_up_requests"] += 1
+        request.extensions["trace"] = _trace_warm_up
+    else:
+        _stats["requests"] += 1
+        request.extensions["trace"] = _trace
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("AZURE_OPENAI_HTTP2 is set but 'h2' is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Return the worker-wide async HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _stats["http2"] = _http2_available()
+        _client = httpx.AsyncClient(
+            http2=_stats["http2"],
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+            event_hooks={"request": [_on_request]},
+        )
+    return _client
+
+
+def build_llm(**overrides) -> "AzureChatOpenAI":
+    """Create an AzureChatOpenAI that shares the worker-wide connection pool."""
+    # Imported here: langchain_openai is the slowest import in the app
+    from langchain_openai import AzureChatOpenAI
+
+    params = dict(
+        model="gpt-4o-mini",
+        deployment_name="gpt-4o-mini",
+        api_key=os.getenv("AZURE_OPENAI_API_KEY_2"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_2"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION_2"),
+    )
+    params.update(overrides)
+    return AzureChatOpenAI(http_async_client=get_http_async_client(), **params)
+
+
+async def warm_up(connections: int = WARM_CONNECTIONS):
+    """Open keep-alive connections to the Azure endpoint ahead of the first chat turn.
+
+    Any HTTP response (including 401/404) means TLS and the TCP connection are
+    established and parked in the pool, so the warm-up request carries no key.
+    """
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT_2")
+    if not endpoint or connections <= 0:
+        return
+    client = get_http_async_client()
+    before = _stats["warmed_connections"]
+
+    async def _touch():
+        try:
+            response = await client.get(endpoint.rstrip("/") + "/openai/deployments", timeout=5.0,
+                                        extensions={"warm_up": True})
+            await response.aclose()
+        except httpx.HTTPError as e:
+            logger.warning(f"Azure OpenAI warm-up request failed: {e}")
+
+    await asyncio.gather(*(_touch() for _ in range(connections)))
+    logger.info(f"Warmed {_stats['warmed_connections'] - before} Azure OpenAI connection(s)")
+
+
+def get_stats() -> Dict[str, Any]:
+    requests = _stats["requests"]
+    new_connections = _stats["new_connections"]
+    return {
+        **_stats,
+        "reused_connections": max(requests - new_connections, 0),
+        "reuse_ratio": round(1 - new_connections / requests, 4) if requests else None,
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+    }
+
+
+async def aclose():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,197 @@
+# On-demand request profiling: per-request CPU/async profiles saved as flame graphs.
+#
+# A request is profiled when a trusted client sends ``X-Profile: <PROFILING_TOKEN>``,
+# when it falls in the sample rate, or while an admin has switched profiling on.
+# When none of these apply the middleware only times the request.
+
+import os
+import hmac
+import time
+import asyncio
+import random
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_FORMAT = os.getenv("PROFILING_FORMAT", "speedscope")  # speedscope | collapsed
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+# Oldest profiles are deleted once the directory holds more than this (0 keeps all)
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+PROFILE_SUFFIXES = (".speedscope.json", ".collapsed.txt")
+PROFILE_HEADER = b"x-profile"
+
+
+class ProfilingState:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = PROFILING_SAMPLE_RATE
+        self.active = False
+        self.recent = deque(maxlen=int(os.getenv("PROFILING_HISTORY", "500")))
+        self.counters = {"profiled": 0, "skipped_busy": 0, "pruned": 0}
+        self._profiler_class = None
+        self._profiler_missing = False
+
+    def profiler_class(self):
+        if self._profiler_class is None and not self._profiler_missing:
+            try:
+                from pyinstrument import Profiler
+                self._profiler_class = Profiler
+            except ImportError:
+                self._profiler_missing = True
+                logger.warning("Request profiling requested but pyinstrument is not installed")
+        return self._profiler_class
+
+    def record(self, method: str, path: str, duration: float, status: Optional[int], profile: Optional[str]):
+        self.recent.append({
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "profile": profile,
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return sorted(self.recent, key=lambda r: r["duration_ms"], reverse=True)[:limit]
+
+    def summary(self, limit: int = 20) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "format": PROFILING_FORMAT,
+            "directory": os.path.abspath(PROFILING_DIR),
+            **self.counters,
+            "slowest": self.slowest(limit),
+        }
+
+
+state = ProfilingState()
+
+
+def is_trusted(token: Optional[str]) -> bool:
+    # Compared as bytes: header values are latin-1 text, which compare_digest rejects as str
+    return (bool(PROFILING_TOKEN) and token is not None
+            and hmac.compare_digest(token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8")))
+
+
+def _header_requests_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return is_trusted(value.decode("latin-1"))
+    return False
+
+
+def _should_profile(scope) -> bool:
+    if state.enabled:
+        return True
+    if state.sample_rate and random.random() < state.sample_rate:
+        return True
+    return bool(PROFILING_TOKEN) and _header_requests_profile(scope)
+
+
+def collapsed_stacks(root_frame) -> str:
+    """Render a pyinstrument frame tree in Brendan Gregg's collapsed format (self time in µs)."""
+    lines = []
+
+    def walk(frame, stack):
+        label = f"{frame.function} ({frame.file_path_short}:{frame.line_no})"
+        stack = stack + [label.replace(";", ":")]
+        micros = int(frame.self_time * 1_000_000)
+        if micros:
+            lines.append(f"{';'.join(stack)} {micros}")
+        for child in frame.children:
+            walk(child, stack)
+
+    if root_frame is not None:
+        walk(root_frame, [])
+    return "\n".join(lines) + "\n"
+
+
+def save_profile(profiler, method: str, path: str, duration: float) -> str:
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    slug = path.strip("/").replace("/", "_") or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    base = os.path.join(PROFILING_DIR, f"{stamp}_{method}_{slug}_{int(duration * 1000)}ms")
+    if PROFILING_FORMAT == "collapsed":
+        filename = base + ".collapsed.txt"
+        content = collapsed_stacks(profiler.last_session.root_frame())
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        filename = base + ".speedscope.json"
+        content = profiler.output(renderer=SpeedscopeRenderer())
+    with open(filename, "w") as f:
+        f.write(content)
+    state.counters["pruned"] += prune_profiles(PROFILING_DIR, PROFILING_MAX_FILES)
+    return filename
+
+
+def prune_profiles(directory: str, keep: int) -> int:
+    """Delete all but the newest ``keep`` profiles in ``directory``; returns how many went."""
+    if keep <= 0:
+        return 0
+    # Names start with a UTC timestamp, so name order is age order
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIXES))
+    removed = 0
+    for name in profiles[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware so the endpoint runs in the same task as the profiler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler = None
+        if _should_profile(scope):
+            profiler_class = state.profiler_class()
+            if profiler_class is not None:
+                if state.active:
+                    # pyinstrument profiles one request at a time per thread
+                    state.counters["skipped_busy"] += 1
+                else:
+                    state.active = True
+                    profiler = profiler_class(interval=PROFILING_INTERVAL, async_mode="enabled")
+                    profiler.start()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            profile_path = None
+            if profiler is not None:
+                profiler.stop()
+                state.active = False
+                state.counters["profiled"] += 1
+                try:
+                    profile_path = await asyncio.to_thread(
+                        save_profile, profiler, scope["method"], scope["path"], duration
+                    )
+                except Exception as e:
+                    logger.error(f"Could not save profile for {scope['path']}: {e}")
+            state.record(scope["method"], scope["path"], duration, status, profile_path)
@@ -0,0 +1,166 @@
+# Read-replica routing for history and listing queries.
+#
+# Read-only endpoints take their session from ReplicaSet.read_session(), which
+# picks a replica whose replay lag is under REPLICA_MAX_LAG_SECONDS and falls
+# back to the primary otherwise. For READ_YOUR_WRITES_SECONDS after a write to
+# a thread, reads of that thread stay on the primary.
+#
+# The worker that served a write remembers it, but the next read may reach
+# another worker. Write responses therefore carry the write time in
+# ``X-Last-Write-At`` (epoch seconds), and clients send it back on reads: a read
+# whose client wrote within READ_YOUR_WRITES_SECONDS goes to the primary on any
+# worker.
+
+import os
+import time
+import random
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+STICKY_MAX_ENTRIES = 10000
+
+# Replay caught up with receive only means no lag while the WAL receiver is
+# running; a disconnected replica also has nothing left to replay. Otherwise
+# the lag is the age of the last replayed transaction, and NULL (unusable) if
+# nothing has been replayed yet. pg_stat_wal_receiver shows status only to
+# superusers and members of pg_read_all_stats; other roles see the receiver's
+# pid with every other column NULL, so a visible pid with a NULL status counts
+# as running and the check falls back to the LSN comparison. Grant
+# pg_read_all_stats to the replica role to also tell "streaming" from
+# "starting" or "waiting".
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver
+                         WHERE status = 'streaming' OR (status IS NULL AND pid IS NOT NULL)) THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+def written_recently(last_write_at: Optional[float]) -> bool:
+    """True if a client-reported write time (epoch seconds) is inside the read-your-writes window."""
+    return last_write_at is not None and time.time() - last_write_at < READ_YOUR_WRITES_SECONDS
+
+
+def replica_urls_from_env() -> List[str]:
+    raw = os.getenv("CHATBOT_READ_REPLICAS", "")
+    return [url.strip() for url in raw.split(",") if url.strip()]
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url, future=True, pool_pre_ping=True)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.engine.url.host}:{self.engine.url.port}/{self.engine.url.database}"
+
+    def refresh_lag(self):
+        try:
+            with self.engine.connect() as connection:
+                lag = connection.execute(LAG_QUERY).scalar()
+            self.lag = float(lag) if lag is not None else None
+        except Exception as e:
+            logger.warning(f"Replica {self.name} lag check failed: {e}")
+            self.lag = None
+        self.checked_at = time.monotonic()
+
+    def usable(self) -> bool:
+        # Called from sync dependencies (threadpool), so the lag query may block here
+        if time.monotonic() - self.checked_at > REPLICA_LAG_CHECK_INTERVAL:
+            self.refresh_lag()
+        return self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+
+class ReplicaSet:
+    def __init__(self, primary_engine, primary_sessionmaker, replica_urls: List[str]):
+        self.primary_engine = primary_engine
+        self.primary_sessionmaker = primary_sessionmaker
+        self.replicas = [Replica(url) for url in replica_urls]
+        self._recent_writes: Dict[str, float] = {}
+        self.counters = {
+            "replica": 0,
+            "primary_read_your_writes": 0,
+            "primary_client_write": 0,
+            "primary_replica_lagging": 0,
+            "primary_no_replica": 0,
+            "replica_miss_fallback": 0,
+        }
+
+    def note_write(self, key: str):
+        now = time.monotonic()
+        if len(self._recent_writes) >= STICKY_MAX_ENTRIES:
+            self._recent_writes = {k: t for k, t in self._recent_writes.items() if t > now}
+        self._recent_writes[key] = now + READ_YOUR_WRITES_SECONDS
+
+    def _sticky(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        until = self._recent_writes.get(key)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            self._recent_writes.pop(key, None)
+            return False
+        return True
+
+    def _pick(self, key: Optional[str], last_write_at: Optional[float] = None) -> Optional[Replica]:
+        if not self.replicas:
+            self.counters["primary_no_replica"] += 1
+            return None
+        if self._sticky(key):
+            self.counters["primary_read_your_writes"] += 1
+            return None
+        if written_recently(last_write_at):
+            self.counters["primary_client_write"] += 1
+            return None
+        candidates = [replica for replica in self.replicas if replica.usable()]
+        if not candidates:
+            self.counters["primary_replica_lagging"] += 1
+            return None
+        self.counters["replica"] += 1
+        return random.choice(candidates)
+
+    def read_session(self, key: Optional[str] = None,
+                     last_write_at: Optional[float] = None) -> Tuple[object, bool]:
+        """Return ``(session, on_replica)`` for a read of ``key`` (a thread_id).
+
+        ``last_write_at`` is the client's ``X-Last-Write-At``, if it sent one.
+        """
+        replica = self._pick(key, last_write_at)
+        if replica is None:
+            return self.primary_sessionmaker(), False
+        return replica.SessionLocal(), True
+
+    def primary_session(self):
+        self.counters["replica_miss_fallback"] += 1
+        return self.primary_sessionmaker()
+
+    def read_engine(self):
+        replica = self._pick(None)
+        return replica.engine if replica is not None else self.primary_engine
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            "replicas": [
+                {"name": replica.name, "lag_seconds": replica.lag, "usable": (
+                    replica.lag is not None and replica.lag <= REPLICA_MAX_LAG_SECONDS
+                )}
+                for replica in self.replicas
+            ],
+        }
@@ -0,0 +1,247 @@
+# Hash-sharded thread storage across multiple Postgres databases.
+#
+# Each thread_id maps to one shard via a consistent-hash ring. A shard owns the
+# thread's user_sessions rows and its LangGraph checkpoints, with its own engine,
+# async connection pool, checkpointer and compiled workflow.
+#
+# Shards are configured with CHATBOT_SHARDS, a JSON list such as
+#   [{"name": "s0", "url": "postgresql+psycopg://.../chat_s0"},
+#    {"name": "s1", "url": "postgresql+psycopg://.../chat_s1", "checkpoint_url": "postgresql+psycopg://.../ckpt_s1",
+#     "replica_urls": ["postgresql+psycopg://...replica.../chat_s1"]}]
+# Without it the app runs a single "default" shard on its usual databases, with
+# read replicas from CHATBOT_READ_REPLICAS.
+#
+# Adding a shard moves roughly 1/N of the threads; run
+#   python sharding.py rebalance --new-shards '<json>' [--dry-run]
+# with writes paused, then deploy the new CHATBOT_SHARDS.
+
+import os
+import json
+import asyncio
+import bisect
+import hashlib
+import argparse
+import logging
+from contextlib import AsyncExitStack
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import storage
+from replicas import ReplicaSet, replica_urls_from_env
+
+logger = logging.getLogger(__name__)
+
+VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "128"))
+
+# Tables keyed by thread_id that move with a thread during rebalancing
+SESSION_TABLES = ["user_sessions", "thread_summaries"]
+CHECKPOINT_TABLES = ["checkpoints", "checkpoint_blobs", "checkpoint_writes"]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def to_conninfo(url: str) -> str:
+    return url.replace("postgresql+psycopg", "postgresql")
+
+
+class HashRing:
+    def __init__(self, names: Iterable[str], virtual_nodes: int = VIRTUAL_NODES):
+        points = []
+        for name in names:
+            for i in range(virtual_nodes):
+                points.append((_hash(f"{name}#{i}"), name))
+        points.sort()
+        self._keys = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def node_for(self, key: str) -> str:
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._names[index]
+
+
+class Shard:
+    def __init__(self, name: str, url: str, checkpoint_url: Optional[str] = None, engine=None,
+                 replica_urls: Optional[List[str]] = None, backend: Optional[storage.StorageBackend] = None):
+        self.name = name
+        self.url = url
+        self.checkpoint_url = checkpoint_url or url
+        self.backend = backend or storage.get_backend()
+        self.engine = engine or self.backend.create_engine(url)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.replicas = ReplicaSet(self.engine, self.SessionLocal, replica_urls or [])
+        self.checkpointer = None
+        self.workflow = None
+
+    def session(self):
+        return self.SessionLocal()
+
+    async def open(self, stack: AsyncExitStack, workflow, serde=None):
+        self.checkpointer = await self.backend.open_checkpointer(stack, self.checkpoint_url, serde)
+        workflow.set_checkpointer(self.checkpointer)
+        self.workflow = workflow
+
+
+class ShardRouter:
+    def __init__(self, shards: List[Shard]):
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards = shards
+        self.by_name: Dict[str, Shard] = {shard.name: shard for shard in shards}
+        self.ring = HashRing(self.by_name)
+        self.counters = {shard.name: 0 for shard in shards}
+
+    def shard_for(self, thread_id: str) -> Shard:
+        shard = self.by_name[self.ring.node_for(thread_id)]
+        self.counters[shard.name] += 1
+        return shard
+
+    def all(self) -> List[Shard]:
+        return list(self.shards)
+
+    async def gather(self, func) -> list:
+        """Run the blocking ``func(shard)`` on every shard concurrently, in shard order."""
+        return await asyncio.gather(*(asyncio.to_thread(func, shard) for shard in self.shards))
+
+    async def open(self, stack: AsyncExitStack, workflow_factory, serde_factory=None):
+        """Open every shard's checkpointer and attach ``workflow_factory(shard)`` to it."""
+        await asyncio.gather(*(
+            shard.open(stack, workflow_factory(shard), serde_factory() if serde_factory else None)
+            for shard in self.shards
+        ))
+
+
+def load_shard_configs(default_url: str, default_checkpoint_url: str) -> List[dict]:
+    raw = os.getenv("CHATBOT_SHARDS")
+    if not raw:
+        return [{
+            "name": "default",
+            "url": default_url,
+            "checkpoint_url": default_checkpoint_url,
+            "replica_urls": replica_urls_from_env(),
+        }]
+    return parse_shard_configs(raw)
+
+
+def parse_shard_configs(raw: str) -> List[dict]:
+    configs = json.loads(raw)
+    names = [config["name"] for config in configs]
+    if len(names) != len(set(names)):
+        raise ValueError("Shard names must be unique")
+    return configs
+
+
+def build_router(configs: List[dict], engines: Optional[Dict[str, object]] = None,
+                 backend: Optional[storage.StorageBackend] = None) -> ShardRouter:
+    """Build a router; ``engines`` maps URLs to engines the caller already created."""
+    engines = engines or {}
+    return ShardRouter([
+        Shard(config["name"], config["url"], config.get("checkpoint_url"), engines.get(config["url"]),
+              config.get("replica_urls"), backend)
+        for config in configs
+    ])
+
+
+# Rebalancing
+
+def _thread_ids(shard: Shard, checkpoint_engine) -> List[str]:
+    thread_ids = set()
+    with shard.engine.connect() as connection:
+        for table in SESSION_TABLES:
+            thread_ids.update(row[0] for row in connection.execute(text(f"SELECT DISTINCT thread_id FROM {table}")))
+    with checkpoint_engine.connect() as connection:
+        thread_ids.update(row[0] for row in connection.execute(text("SELECT DISTINCT thread_id FROM checkpoints")))
+    return sorted(thread_ids)
+
+
+def _move_rows(source_engine, target_engine, tables: List[str], thread_ids: List[str]):
+    from sqlalchemy import MetaData, Table
+    from sqlalchemy.dialects.postgresql import insert
+
+    if source_engine.url.render_as_string(hide_password=False) == target_engine.url.render_as_string(hide_password=False):
+        # Both shards share this database, the rows are already where they need to be
+        return
+    with source_engine.begin() as source, target_engine.begin() as target:
+        for name in tables:
+            table = Table(name, MetaData(), autoload_with=source)
+            rows = source.execute(table.select().where(table.c.thread_id.in_(thread_ids))).mappings().all()
+            if rows:
+                target.execute(insert(table).on_conflict_do_nothing(), [dict(row) for row in rows])
+        # The target transaction commits before the source one; if it fails the deletes roll back
+        for name in tables:
+            source.execute(text(f"DELETE FROM {name} WHERE thread_id = ANY(:ids)"), {"ids": thread_ids})
+
+
+def _ensure_target_schema(shard: Shard):
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from app import Base
+    import thread_summaries
+
+    Base.metadata.create_all(bind=shard.engine)
+    thread_summaries.Base.metadata.create_all(bind=shard.engine)
+    with PostgresSaver.from_conn_string(to_conninfo(shard.checkpoint_url)) as saver:
+        saver.setup()
+
+
+def rebalance(old_configs: List[dict], new_configs: List[dict], dry_run: bool = False, batch_size: int = 500):
+    # Moving rows between databases only makes sense for Postgres shards
+    backend = storage.get_backend("postgres")
+    old_router = build_router(old_configs, backend=backend)
+    new_router = build_router(new_configs, backend=backend)
+    if not dry_run:
+        for shard in new_router.shards:
+            if shard.name not in old_router.by_name:
+                _ensure_target_schema(shard)
+
+    checkpoint_engines = {}
+
+    def checkpoint_engine(shard: Shard):
+        if shard.checkpoint_url not in checkpoint_engines:
+            checkpoint_engines[shard.checkpoint_url] = create_engine(shard.checkpoint_url, future=True)
+        return checkpoint_engines[shard.checkpoint_url]
+
+    moved = {}
+    for source in old_router.shards:
+        moves: Dict[str, List[str]] = {}
+        for thread_id in _thread_ids(source, checkpoint_engine(source)):
+            owner = new_router.ring.node_for(thread_id)
+            if owner != source.name:
+                moves.setdefault(owner, []).append(thread_id)
+        for owner, thread_ids in moves.items():
+            moved[(source.name, owner)] = len(thread_ids)
+            print(f"{source.name} -> {owner}: {len(thread_ids)} thread(s)")
+            if dry_run:
+                continue
+            target = new_router.by_name[owner]
+            for i in range(0, len(thread_ids), batch_size):
+                batch = thread_ids[i:i + batch_size]
+                _move_rows(source.engine, target.engine, SESSION_TABLES, batch)
+                _move_rows(checkpoint_engine(source), checkpoint_engine(target), CHECKPOINT_TABLES, batch)
+    for engine in checkpoint_engines.values():
+        engine.dispose()
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move threads to match a new shard list")
+    rebalance_parser.add_argument("--new-shards", required=True, help="JSON shard list after the change")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    rebalance_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "rebalance":
+        from app import DEFAULT_DATABASE_URL, TARGET_DATABASE_URL
+
+        old_configs = load_shard_configs(TARGET_DATABASE_URL, DEFAULT_DATABASE_URL)
+        new_configs = parse_shard_configs(args.new_shards)
+        moved = rebalance(old_configs, new_configs, dry_run=args.dry_run, batch_size=args.batch_size)
+        print(f"{'Would move' if args.dry_run else 'Moved'} {sum(moved.values())} thread(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from typing import Annotated, List, Dict, Any
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AnyMessage, HumanMessage, AIMessage
 import logging
 
+from llm_client import build_llm
+from workflow_registry import with_system_message
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,64 +18,55 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Validate required environment variables
 required_env_vars = [
     "AZURE_OPENAI_API_KEY_2",
     "AZURE_OPENAI_ENDPOINT_2",
     "AZURE_OPENAI_API_VERSION_2"
 ]
 
-missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-if missing_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+def validate_env():
+    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
 class State(TypedDict):
-    message: Annotated[List[Dict[str, str]], add_messages]
+    message: Annotated[List[AnyMessage], add_messages]
 
-def initialize_llm() -> AzureChatOpenAI:
+def initialize_llm():
     try:
-        llm = AzureChatOpenAI(
-            model="gpt-4o-mini",
-            deployment_name="gpt-4o-mini",
-            api_key=os.getenv("AZURE_OPENAI_API_KEY_2"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT_2"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION_2"),
-            temperature=0.7,
-            request_timeout=30,
-        )
-        # Test the LLM connection
-        test_message = [HumanMessage(content="test")]
-        test_response = llm.invoke(test_message)
+        validate_env()
+        llm = build_llm(temperature=0.7, request_timeout=30)
         logger.info("LLM initialized successfully")
         return llm
     except Exception as e:
         logger.error(f"Failed to initialize Azure OpenAI: {str(e)}")
         raise RuntimeError(f"Failed to initialize Azure OpenAI: {str(e)}")
 
+@lru_cache(maxsize=1)
+def get_llm():
+    # Built on first call instead of at import; no network round trip
+    return initialize_llm()
+
+def check_llm_connection():
+    """Blocking round trip to Azure OpenAI, for readiness checks and scripts."""
+    get_llm().invoke([HumanMessage(content="test")])
+
 def chatbot(state: State) -> Dict[str, Any]:
     try:
         if not state.get("message"):
             logger.warning("No messages provided in state")
             raise ValueError("No messages provided in state")
         
-        # Convert the message format
-        messages = [
-            HumanMessage(content=msg["content"]) if msg["role"] == "user" 
-            else AIMessage(content=msg["content"])
-            for msg in state["message"]
-        ]
+        # add_messages has already turned the role dicts into message objects,
+        # converting each one once when it was appended
+        messages = state["message"]
         
         logger.info(f"Processing message: {messages[-1].content}")
-        response = llm.invoke(messages)
+        response = get_llm().invoke(with_system_message(messages))
         
-        # Format the response
-        formatted_response = {
-            "role": "assistant",
-            "content": response.content if hasattr(response, 'content') else str(response)
-        }
-        
-        logger.info(f"Generated response: {formatted_response['content'][:100]}...")
-        return {"message": formatted_response}
+        logger.info(f"Generated response: {response.content[:100]}...")
+        # Only the new message; the reducer appends it
+        return {"message": AIMessage(content=response.content)}
     except Exception as e:
         logger.error(f"Error in chatbot function: {str(e)}")
         error_message = {
@@ -81,13 +75,6 @@ def chatbot(state: State) -> Dict[str, Any]:
         }
         return {"message": error_message}
 
-# Initialize the language model
-try:
-    llm = initialize_llm()
-except Exception as e:
-    logger.critical(f"Failed to initialize application: {str(e)}")
-    raise
-
 # Build the graph
 graph_builder = StateGraph(State)
 graph_builder.add_edge(START, "chatbot")
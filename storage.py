@@ -0,0 +1,182 @@
+# Pluggable storage for turns, threads and checkpoints.
+#
+# A backend decides where the SQLAlchemy tables (user_sessions,
+# thread_summaries, ...) and the LangGraph checkpoints live. STORAGE_BACKEND
+# selects it:
+#   postgres - the configured Postgres URLs and AsyncPostgresSaver (default)
+#   sqlite   - STORAGE_SQLITE_PATH for tables, STORAGE_SQLITE_CHECKPOINT_PATH
+#              for checkpoints (AsyncSqliteSaver)
+#   memory   - one in-process SQLite database and MemorySaver; nothing survives
+#              a restart, for tests, benchmarks and demos
+#
+# The embedded backends ignore database URLs: every engine they hand out is the
+# same database. tests/test_storage_conformance.py checks every backend.
+
+import os
+import sqlite3
+from uuid import uuid4
+from contextlib import AsyncExitStack
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", "chatbot.db")
+STORAGE_SQLITE_CHECKPOINT_PATH = os.getenv("STORAGE_SQLITE_CHECKPOINT_PATH", "chatbot_checkpoints.db")
+# Checkpointer pool size per shard
+SHARD_POOL_MAX_SIZE = int(os.getenv("SHARD_POOL_MAX_SIZE", "20"))
+
+
+def dialect_insert(dialect_name: str, table):
+    """INSERT construct with on_conflict_do_nothing/on_conflict_do_update for ``dialect_name``."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Upserts are not supported on {dialect_name}")
+    return insert(table)
+
+
+def upsert(db, table):
+    """dialect_insert() for the database behind the session ``db``."""
+    return dialect_insert(db.get_bind().dialect.name, table)
+
+
+class StorageBackend:
+    name = ""
+    # Whether the backend can create databases and serve streaming read replicas
+    server = False
+
+    def create_engine(self, url: str):
+        raise NotImplementedError
+
+    async def open_checkpointer(self, stack: AsyncExitStack, url: str, serde=None):
+        """Return a ready checkpointer; anything it holds open is closed by ``stack``."""
+        raise NotImplementedError
+
+
+class PostgresStorage(StorageBackend):
+    name = "postgres"
+    server = True
+
+    def create_engine(self, url: str):
+        return create_engine(url, future=True)
+
+    async def open_checkpointer(self, stack: AsyncExitStack, url: str, serde=None):
+        from psycopg_pool import AsyncConnectionPool
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+        pool = await stack.enter_async_context(AsyncConnectionPool(
+            conninfo=url.replace("postgresql+psycopg", "postgresql"),
+            kwargs={"autocommit": True},
+            max_size=SHARD_POOL_MAX_SIZE,
+        ))
+        checkpointer = AsyncPostgresSaver(pool, serde=serde)
+        await checkpointer.setup()
+        return checkpointer
+
+
+def _enable_wal(dbapi_connection, connection_record):
+    # Readers do not block the writer, and a busy writer is waited for instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class SqliteStorage(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str = STORAGE_SQLITE_PATH,
+                 checkpoint_path: str = STORAGE_SQLITE_CHECKPOINT_PATH):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self._engine = None
+
+    def create_engine(self, url: str):
+        if self._engine is None:
+            self._engine = create_engine(
+                f"sqlite:///{self.path}",
+                future=True,
+                # Sessions are used from FastAPI's threadpool and asyncio.to_thread
+                connect_args={"check_same_thread": False},
+            )
+            event.listen(self._engine, "connect", _enable_wal)
+        return self._engine
+
+    async def open_checkpointer(self, stack: AsyncExitStack, url: str, serde=None):
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise RuntimeError("The sqlite storage backend requires langgraph-checkpoint-sqlite") from e
+
+        # Checkpoints get their own file so aiosqlite and SQLAlchemy do not contend for one lock
+        connection = await stack.enter_async_context(aiosqlite.connect(self.checkpoint_path))
+        checkpointer = AsyncSqliteSaver(connection, serde=serde)
+        await checkpointer.setup()
+        return checkpointer
+
+
+def _set_busy_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class MemoryStorage(StorageBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._engine = None
+        self._keeper = None
+
+    def create_engine(self, url: str):
+        if self._engine is None:
+            if sqlite3.sqlite_version_info < (3, 36):
+                raise RuntimeError("The memory storage backend requires SQLite 3.36 or newer (memdb VFS)")
+            # A named database in the memdb VFS: every pooled connection opens the same
+            # in-memory database, each with its own transactions and normal SQLite
+            # locking. One shared connection (StaticPool) would interleave concurrent
+            # sessions' transactions, and a shared-cache database fails concurrent
+            # writers with "database table is locked" instead of waiting.
+            uri = f"file:/chatbot-{uuid4().hex}?vfs=memdb"
+            # The database lives as long as one connection to it is open
+            self._keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._engine = create_engine(
+                f"sqlite:///{uri}&uri=true",
+                future=True,
+                # Sessions are used from FastAPI's threadpool and asyncio.to_thread
+                connect_args={"check_same_thread": False},
+                # Connections are cheap here; never make a caller wait for a free one
+                poolclass=QueuePool,
+                max_overflow=-1,
+            )
+            event.listen(self._engine, "connect", _set_busy_timeout)
+        return self._engine
+
+    async def open_checkpointer(self, stack: AsyncExitStack, url: str, serde=None):
+        from langgraph.checkpoint.memory import MemorySaver
+
+        return MemorySaver(serde=serde)
+
+
+BACKENDS = {
+    "postgres": PostgresStorage,
+    "sqlite": SqliteStorage,
+    "memory": MemoryStorage,
+}
+
+_backends: Dict[str, StorageBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> StorageBackend:
+    """The process-wide backend called ``name`` (STORAGE_BACKEND by default)."""
+    name = name or STORAGE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(BACKENDS)}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
@@ -3,11 +3,15 @@ import requests
 import json
 from datetime import datetime
 import os
-from typing import Dict, List
+import time
+from uuid import uuid4
+from typing import Dict, List, Optional
 import pandas as pd
 
 # Configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
 
 # Session state initialization
 if "user_id" not in st.session_state:
@@ -16,33 +20,74 @@ if "thread_id" not in st.session_state:
     st.session_state.thread_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "thread_tokens" not in st.session_state:
+    st.session_state.thread_tokens = {}
+if "empty_thread" not in st.session_state:
+    st.session_state.empty_thread = None
+if "last_write_at" not in st.session_state:
+    st.session_state.last_write_at = None
 
 class ChatAPI:
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip('/')
 
+    # The backend reports when we last wrote; sending it back keeps our reads
+    # on the primary database until replicas have caught up
+    def _remember_write(self, response):
+        if "X-Last-Write-At" in response.headers:
+            st.session_state.last_write_at = response.headers["X-Last-Write-At"]
+
+    def _read_headers(self) -> Dict:
+        if st.session_state.last_write_at:
+            return {"X-Last-Write-At": st.session_state.last_write_at}
+        return {}
+
     def create_session(self, user_id: str) -> Dict:
         response = requests.post(
             f"{self.base_url}/new_session",
             json={"user_id": user_id}
         )
         response.raise_for_status()
+        self._remember_write(response)
         return response.json()
 
-    def continue_session(self, user_id: str, thread_id: str, question: str) -> Dict:
-        response = requests.post(
-            f"{self.base_url}/continue_session",
-            json={
-                "user_id": user_id,
-                "thread_id": thread_id,
-                "question": question
-            }
-        )
+    def continue_session(self, user_id: str, thread_id: str, question: str,
+                         thread_token: Optional[str] = None) -> Dict:
+        # Same key on every retry, so the backend runs the turn only once
+        idempotency_key = str(uuid4())
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = requests.post(
+                    f"{self.base_url}/continue_session",
+                    json={
+                        "user_id": user_id,
+                        "thread_id": thread_id,
+                        "question": question,
+                        "thread_token": thread_token
+                    },
+                    headers={"Idempotency-Key": idempotency_key},
+                    timeout=REQUEST_TIMEOUT,
+                )
+            except (requests.Timeout, requests.ConnectionError):
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            self._remember_write(response)
+            return response.json()
+
+    def get_session_history(self, thread_id: str) -> List[Dict]:
+        response = requests.get(f"{self.base_url}/session_history/{thread_id}", headers=self._read_headers())
         response.raise_for_status()
         return response.json()
 
-    def get_session_history(self, thread_id: str) -> List[Dict]:
-        response = requests.get(f"{self.base_url}/session_history/{thread_id}")
+    def list_threads(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{self.base_url}/users/{user_id}/threads", params=params,
+                                headers=self._read_headers())
         response.raise_for_status()
         return response.json()
 
@@ -62,7 +107,7 @@ def initialize_chat_interface():
                     try:
                         chat_api = ChatAPI(API_URL)
                         response = chat_api.create_session(user_id)
-                        st.session_state.thread_id = response["thread_id"]
+                        start_thread(response)
                         st.success("Session started successfully!")
                         st.rerun()
                     except Exception as e:
@@ -73,19 +118,51 @@ def initialize_chat_interface():
                 try:
                     chat_api = ChatAPI(API_URL)
                     response = chat_api.create_session(st.session_state.user_id)
-                    st.session_state.thread_id = response["thread_id"]
-                    st.session_state.messages = []
+                    start_thread(response)
                     st.success("New thread started!")
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error creating new thread: {str(e)}")
             
+            show_past_threads()
+
             if st.button("Logout"):
                 st.session_state.user_id = None
                 st.session_state.thread_id = None
                 st.session_state.messages = []
+                st.session_state.thread_tokens = {}
+                st.session_state.last_write_at = None
                 st.rerun()
 
+def start_thread(response: Dict):
+    st.session_state.thread_id = response["thread_id"]
+    st.session_state.messages = []
+    if response.get("thread_token"):
+        st.session_state.thread_tokens[response["thread_id"]] = response["thread_token"]
+        # With thread tokens the backend writes nothing until the first answer
+        st.session_state.empty_thread = response["thread_id"]
+
+def show_past_threads():
+    st.subheader("Past Threads")
+    try:
+        chat_api = ChatAPI(API_URL)
+        threads = chat_api.list_threads(st.session_state.user_id)["threads"]
+    except Exception as e:
+        st.error(f"Error loading threads: {str(e)}")
+        return
+    if not threads:
+        st.caption("No threads yet")
+    for thread in threads:
+        title = thread["title"] or "New thread"
+        label = f"{title[:40]} ({thread['turn_count']})"
+        if st.button(label, key=f"thread-{thread['thread_id']}",
+                     disabled=thread["thread_id"] == st.session_state.thread_id):
+            st.session_state.thread_id = thread["thread_id"]
+            st.session_state.messages = []
+            if thread.get("thread_token"):
+                st.session_state.thread_tokens[thread["thread_id"]] = thread["thread_token"]
+            st.rerun()
+
 def load_session_history():
     if st.session_state.thread_id:
         try:
@@ -126,7 +203,8 @@ def handle_user_input():
                     response = chat_api.continue_session(
                         st.session_state.user_id,
                         st.session_state.thread_id,
-                        prompt
+                        prompt,
+                        st.session_state.thread_tokens.get(st.session_state.thread_id)
                     )
                     ai_response = response["ai_answer"]
                     st.write(ai_response)
@@ -166,7 +244,7 @@ def main():
     initialize_chat_interface()
     
     if st.session_state.user_id and st.session_state.thread_id:
-        if not st.session_state.messages:
+        if not st.session_state.messages and st.session_state.thread_id != st.session_state.empty_thread:
             load_session_history()
         
         # Display chat interface
@@ -0,0 +1,63 @@
+import os
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+import export
+
+
+@pytest.fixture
+def client():
+    return TestClient(app_module.app)
+
+
+@pytest.mark.parametrize("configured, sent", [(None, None), (None, "anything"), ("secret", None), ("secret", "wrong")])
+def test_export_is_refused_without_the_export_token(client, monkeypatch, configured, sent):
+    monkeypatch.setattr(export, "EXPORT_TOKEN", configured)
+    headers = {"X-Export-Token": sent} if sent is not None else {}
+    assert client.get("/export/sessions", headers=headers).status_code == 403
+
+
+def test_export_with_the_export_token(client, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_TOKEN", "secret")
+    app_module.Base.metadata.create_all(bind=app_module.router.shards[0].engine)
+    response = client.get("/export/sessions?format=jsonl", headers={"X-Export-Token": "secret"})
+    assert response.status_code == 200
+
+
+def _engine_with_rows(rows):
+    import storage
+    from datetime import datetime
+
+    engine = storage.MemoryStorage().create_engine("memory")
+    app_module.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(app_module.UserSession.__table__.insert(), [
+            {"id": row_id, "user_id": "u1", "thread_id": "t1", "question": "q", "ai_answer": "a",
+             "error": error, "timestamp": datetime(2024, 1, 1, 0, 0, second)}
+            for row_id, error, second in rows
+        ])
+    return engine
+
+
+def test_csv_format_does_not_depend_on_the_shard_count():
+    single = _engine_with_rows([("r1", False, 0), ("r2", True, 1)])
+    shards = [_engine_with_rows([("r1", False, 0)]), _engine_with_rows([("r2", True, 1)])]
+
+    one = b"".join(export.export_sessions(single, "csv")).decode()
+    many = b"".join(export.export_sessions(shards, "csv")).decode()
+    assert one == many
+    assert one.splitlines()[1:] == [
+        "r1,u1,t1,q,a,false,2024-01-01T00:00:00.000000",
+        "r2,u1,t1,q,a,true,2024-01-01T00:00:01.000000",
+    ]
+
+
+def test_copy_query_formats_columns_like_the_csv_writer():
+    sql, _ = export.build_query(columns=export.COPY_CSV_COLUMNS)
+    assert "'YYYY-MM-DD\"T\"HH24:MI:SS.US'" in sql
+    assert "THEN 'true'" in sql and "THEN 'false'" in sql
+    assert sql.endswith("ORDER BY user_sessions.timestamp")
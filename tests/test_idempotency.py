@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import idempotency
+from idempotency import IdempotencyError, IdempotencyKey, IdempotencyStore, fingerprint
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, so each store thread gets its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}")
+    idempotency.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+BODY = fingerprint("u1", "t1", "question")
+
+
+def counting(calls, response="answer", gate=None):
+    async def func():
+        calls.append(1)
+        if gate is not None:
+            await gate.wait()
+        return {"ai_answer": response}
+    return func
+
+
+def add_row(session_factory, **values):
+    with session_factory() as db:
+        db.add(IdempotencyKey(**values))
+        db.commit()
+
+
+def test_concurrent_calls_with_one_key_run_once(session_factory):
+    calls = []
+
+    async def scenario():
+        store = IdempotencyStore(session_factory)
+        gate = asyncio.Event()
+        tasks = [asyncio.create_task(store.run("k1", BODY, counting(calls, gate=gate))) for _ in range(5)]
+        await asyncio.sleep(0.1)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+        later = await store.run("k1", BODY, counting(calls))
+        return store, results, later
+
+    store, results, later = asyncio.run(scenario())
+    assert calls == [1]
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(response == {"ai_answer": "answer"} for response, _ in results)
+    assert later == ({"ai_answer": "answer"}, True)
+    assert store.counters["executed"] == 1
+
+
+@pytest.mark.parametrize("in_flight", [True, False])
+def test_key_reused_with_a_different_body_is_rejected(session_factory, in_flight):
+    async def scenario():
+        store = IdempotencyStore(session_factory)
+        gate = asyncio.Event()
+        first = asyncio.create_task(store.run("k1", BODY, counting([], gate=gate)))
+        await asyncio.sleep(0.1)
+        if not in_flight:
+            gate.set()
+            await first
+        with pytest.raises(IdempotencyError) as excinfo:
+            await store.run("k1", fingerprint("u1", "t1", "another question"), counting([]))
+        gate.set()
+        await first
+        return excinfo.value
+
+    assert asyncio.run(scenario()).status_code == 422
+
+
+def test_failure_releases_the_key(session_factory):
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise RuntimeError("LLM unavailable")
+
+    async def scenario():
+        store = IdempotencyStore(session_factory)
+        with pytest.raises(RuntimeError):
+            await store.run("k1", BODY, failing)
+        return await store.run("k1", BODY, counting(calls))
+
+    assert asyncio.run(scenario()) == ({"ai_answer": "answer"}, False)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("row", [
+    # Expired completed response
+    {"status": idempotency.COMPLETED, "response": '{"ai_answer": "stale"}', "created_at_age": 10,
+     "expires_in": -1},
+    # Claim left behind by a crashed worker
+    {"status": idempotency.IN_PROGRESS, "response": None,
+     "created_at_age": idempotency.IDEMPOTENCY_LOCK_SECONDS + 60, "expires_in": 3600},
+])
+def test_expired_or_abandoned_key_is_reclaimed(session_factory, row):
+    now = datetime.utcnow()
+    add_row(session_factory, key="k1", request_hash=BODY, status=row["status"], response=row["response"],
+            created_at=now - timedelta(seconds=row["created_at_age"]),
+            expires_at=now + timedelta(seconds=row["expires_in"]))
+    calls = []
+    result = asyncio.run(IdempotencyStore(session_factory).run("k1", BODY, counting(calls)))
+    assert result == ({"ai_answer": "answer"}, False)
+    assert calls == [1]
+
+
+def test_other_worker_waits_for_the_run_and_replays_it(session_factory):
+    calls = []
+
+    async def scenario():
+        # Two stores on one database stand in for two workers
+        owner, other = IdempotencyStore(session_factory), IdempotencyStore(session_factory)
+        gate = asyncio.Event()
+        first = asyncio.create_task(owner.run("k1", BODY, counting(calls, gate=gate)))
+        await asyncio.sleep(0.1)
+        second = asyncio.create_task(other.run("k1", BODY, counting(calls)))
+        await asyncio.sleep(0.3)
+        assert not second.done()
+        gate.set()
+        return await first, await second
+
+    first, second = asyncio.run(scenario())
+    assert first == ({"ai_answer": "answer"}, False)
+    assert second == ({"ai_answer": "answer"}, True)
+    assert calls == [1]
+
+
+def test_purge_drops_expired_and_overflowing_keys(session_factory):
+    now = datetime.utcnow()
+    add_row(session_factory, key="expired", request_hash=BODY, status=idempotency.COMPLETED, response="{}",
+            created_at=now - timedelta(hours=2), expires_at=now - timedelta(hours=1))
+    for i in range(3):
+        add_row(session_factory, key=f"k{i}", request_hash=BODY, status=idempotency.COMPLETED, response="{}",
+                created_at=now + timedelta(seconds=i), expires_at=now + timedelta(hours=1))
+
+    IdempotencyStore(session_factory, max_keys=2)._purge()
+    with session_factory() as db:
+        assert sorted(row.key for row in db.query(IdempotencyKey)) == ["k1", "k2"]
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import jobs
+from jobs import ChatJob, JobWorkerPool, QueueFullError
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # A file database, so each insert thread gets its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    jobs.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def statuses(session_factory):
+    with session_factory() as db:
+        return {job.job_id: job.status for job in db.query(ChatJob)}
+
+
+def test_concurrent_submissions_never_overflow_the_queue(session_factory):
+    async def scenario():
+        pool = JobWorkerPool(None, session_factory, workers=0, max_queue=3)
+        results = await asyncio.gather(*(pool.submit("u1", "t1", f"q{i}") for i in range(10)),
+                                       return_exceptions=True)
+        return pool, results
+
+    pool, results = asyncio.run(scenario())
+    accepted = [result for result in results if isinstance(result, dict)]
+    assert len(accepted) == 3
+    assert all(isinstance(result, QueueFullError) for result in results if not isinstance(result, dict))
+    assert pool.queue.qsize() == 3
+    assert set(statuses(session_factory)) == {job["job_id"] for job in accepted}
+
+
+def test_stop_fails_queued_and_running_jobs(session_factory):
+    async def scenario():
+        started = asyncio.Event()
+
+        async def handler(job):
+            started.set()
+            await asyncio.Event().wait()
+
+        pool = JobWorkerPool(handler, session_factory, workers=1)
+        await pool.start()
+        running = await pool.submit("u1", "t1", "q1")
+        queued = await pool.submit("u1", "t1", "q2")
+        await started.wait()
+        await pool.stop()
+        return pool, running, queued
+
+    pool, running, queued = asyncio.run(scenario())
+    assert statuses(session_factory) == {running["job_id"]: jobs.FAILED, queued["job_id"]: jobs.FAILED}
+    assert pool.queue.empty()
+
+
+def test_stale_jobs_are_expired(session_factory):
+    old = datetime.utcnow() - timedelta(hours=1)
+    with session_factory() as db:
+        db.add_all([
+            ChatJob(job_id="stale-queued", user_id="u", thread_id="t", question="q", status=jobs.QUEUED, created_at=old),
+            ChatJob(job_id="stale-running", user_id="u", thread_id="t", question="q", status=jobs.RUNNING,
+                    created_at=old, started_at=old),
+            ChatJob(job_id="held", user_id="u", thread_id="t", question="q", status=jobs.RUNNING,
+                    created_at=old, started_at=old),
+            ChatJob(job_id="fresh", user_id="u", thread_id="t", question="q", status=jobs.QUEUED),
+            ChatJob(job_id="done", user_id="u", thread_id="t", question="q", status=jobs.SUCCEEDED, created_at=old),
+        ])
+        db.commit()
+
+    pool = JobWorkerPool(None, session_factory, stale_seconds=60)
+    assert pool._expire_stale(["held"]) == 2
+    assert statuses(session_factory) == {
+        "stale-queued": jobs.FAILED,
+        "stale-running": jobs.FAILED,
+        "held": jobs.RUNNING,
+        "fresh": jobs.QUEUED,
+        "done": jobs.SUCCEEDED,
+    }
+
+
+def test_job_expired_by_another_worker_is_not_run(session_factory):
+    calls = []
+
+    async def scenario():
+        async def handler(job):
+            calls.append(job["job_id"])
+            return "answer"
+
+        pool = JobWorkerPool(handler, session_factory, workers=1)
+        job = await pool.submit("u1", "t1", "q1")
+        # Another worker's reaper gave up on the job while it was still queued here
+        other = JobWorkerPool(None, session_factory, stale_seconds=-60)
+        assert other._expire_stale([]) == 1
+        await pool.start()
+        await pool.queue.join()
+        await pool.stop()
+        return pool, job
+
+    pool, job = asyncio.run(scenario())
+    assert calls == []
+    assert statuses(session_factory) == {job["job_id"]: jobs.FAILED}
+    assert pool.stats()["skipped"] == 1
+
+
+def test_job_expired_while_running_stays_failed(session_factory):
+    async def scenario():
+        async def handler(job):
+            other = JobWorkerPool(None, session_factory, stale_seconds=-60)
+            assert other._expire_stale([]) == 1
+            return "late answer"
+
+        pool = JobWorkerPool(handler, session_factory, workers=1)
+        await pool.start()
+        job = await pool.submit("u1", "t1", "q1")
+        await pool.queue.join()
+        await pool.stop()
+        return pool, job
+
+    pool, job = asyncio.run(scenario())
+    loaded = asyncio.run(pool.get(job["job_id"]))
+    assert loaded["status"] == jobs.FAILED
+    assert loaded["ai_answer"] is None
+    assert pool.stats()["succeeded"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT_2", url)
+    monkeypatch.setattr(llm_client, "_stats", dict(llm_client._stats, requests=0, new_connections=0,
+                                                   warm_up_requests=0, warmed_connections=0))
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_warm_up_requests_are_not_counted_as_reuse(endpoint):
+    async def scenario():
+        await llm_client.warm_up(connections=2)
+        client = llm_client.get_http_async_client()
+        for _ in range(3):
+            response = await client.post(endpoint + "/openai/deployments/gpt-4o-mini/chat/completions")
+            await response.aclose()
+        stats = llm_client.get_stats()
+        await llm_client.aclose()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["warm_up_requests"] == 2
+    assert stats["warmed_connections"] == 2
+    # Chat requests ran on the warmed connections
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 0
+    assert stats["reused_connections"] == 3
+    assert stats["reuse_ratio"] == 1
@@ -0,0 +1,27 @@
+import profiling
+
+
+def test_prune_profiles_keeps_the_newest(tmp_path):
+    names = [f"20250101T0000{i:02d}000000_GET_health_1ms.speedscope.json" for i in range(5)]
+    for name in names + ["notes.txt"]:
+        (tmp_path / name).write_text("{}")
+
+    assert profiling.prune_profiles(str(tmp_path), 2) == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(names[-2:] + ["notes.txt"])
+
+
+def test_prune_profiles_can_be_disabled(tmp_path):
+    (tmp_path / "20250101T000000000000_GET_health_1ms.collapsed.txt").write_text("")
+    assert profiling.prune_profiles(str(tmp_path), 0) == 0
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_profile_header_needs_the_exact_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    assert profiling.is_trusted("secret")
+    assert not profiling.is_trusted("secre")
+    assert not profiling.is_trusted("sécret")
+    assert not profiling.is_trusted(None)
+
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", None)
+    assert not profiling.is_trusted("")
@@ -0,0 +1,48 @@
+import time
+
+import replicas
+from replicas import ReplicaSet
+
+
+class FakeReplica:
+    def __init__(self, usable=True):
+        self._usable = usable
+        self.SessionLocal = lambda: "replica-session"
+
+    def usable(self):
+        return self._usable
+
+
+def replica_set(*fakes):
+    replica_set = ReplicaSet(None, lambda: "primary-session", [])
+    replica_set.replicas = list(fakes)
+    return replica_set
+
+
+def test_fresh_replica_serves_reads():
+    assert replica_set(FakeReplica()).read_session("t1") == ("replica-session", True)
+
+
+def test_lagging_replica_falls_back_to_the_primary():
+    assert replica_set(FakeReplica(usable=False)).read_session("t1") == ("primary-session", False)
+
+
+def test_write_noted_by_this_worker_keeps_reads_on_the_primary():
+    replicas_ = replica_set(FakeReplica())
+    replicas_.note_write("t1")
+    assert replicas_.read_session("t1") == ("primary-session", False)
+    assert replicas_.read_session("t2") == ("replica-session", True)
+
+
+def test_client_reported_write_keeps_reads_on_the_primary():
+    # Another worker served the write; only the client's header knows about it
+    replicas_ = replica_set(FakeReplica())
+    assert replicas_.read_session("t1", time.time() - 1) == ("primary-session", False)
+    assert replicas_.counters["primary_client_write"] == 1
+
+
+def test_old_client_write_reads_from_the_replica():
+    replicas_ = replica_set(FakeReplica())
+    last_write_at = time.time() - replicas.READ_YOUR_WRITES_SECONDS - 1
+    assert replicas_.read_session("t1", last_write_at) == ("replica-session", True)
+
@@ -0,0 +1,55 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+import storage
+from sharding import HashRing, ShardRouter, Shard, _move_rows, parse_shard_configs
+
+KEYS = [str(uuid4()) for _ in range(20000)]
+
+
+def test_mapping_is_deterministic():
+    ring, same = HashRing(["s0", "s1", "s2"]), HashRing(["s2", "s0", "s1"])
+    assert [ring.node_for(key) for key in KEYS[:1000]] == [same.node_for(key) for key in KEYS[:1000]]
+
+
+def test_keys_spread_over_all_shards():
+    ring = HashRing(["s0", "s1", "s2", "s3"])
+    counts = {}
+    for key in KEYS:
+        counts[ring.node_for(key)] = counts.get(ring.node_for(key), 0) + 1
+    assert set(counts) == {"s0", "s1", "s2", "s3"}
+    assert all(abs(count / len(KEYS) - 0.25) < 0.05 for count in counts.values())
+
+
+def test_adding_a_shard_moves_about_one_nth_of_the_keys():
+    before, after = HashRing(["s0", "s1", "s2"]), HashRing(["s0", "s1", "s2", "s3"])
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    # Only keys that now belong to the new shard move, about 1/4 of them
+    assert all(after.node_for(key) == "s3" for key in moved)
+    assert abs(len(moved) / len(KEYS) - 0.25) < 0.05
+
+
+def test_duplicate_shard_names_are_rejected():
+    with pytest.raises(ValueError):
+        parse_shard_configs('[{"name": "s0", "url": "a"}, {"name": "s0", "url": "b"}]')
+    assert [config["name"] for config in parse_shard_configs('[{"name": "s0", "url": "a"}]')] == ["s0"]
+
+
+def test_router_sends_a_thread_to_its_ring_shard():
+    backend = storage.MemoryStorage()
+    router = ShardRouter([Shard(name, "memory", backend=backend) for name in ("s0", "s1")])
+    for key in KEYS[:100]:
+        assert router.shard_for(key).name == router.ring.node_for(key)
+    assert sum(router.counters.values()) == 100
+
+
+def test_moving_rows_within_one_database_is_a_no_op():
+    engine = storage.MemoryStorage().create_engine("memory")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE user_sessions (id TEXT, thread_id TEXT)"))
+        connection.execute(text("INSERT INTO user_sessions VALUES ('r1', 't1')"))
+    _move_rows(engine, engine, ["user_sessions"], ["t1"])
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM user_sessions")).scalar() == 1
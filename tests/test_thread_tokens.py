@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import asyncio
+
+# The listing test imports app, which must not need a database server
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import storage
+import thread_tokens
+from thread_tokens import ThreadTokenError, ThreadTokenManager, _b64decode, _b64encode
+
+
+@pytest.fixture
+def session_factory():
+    engine = storage.MemoryStorage().create_engine("memory")
+    thread_tokens.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def manager(session_factory):
+    return ThreadTokenManager(session_factory, mode="optional", keys="k2:new-secret,k1:old-secret",
+                              deny_list_ttl=0)
+
+
+def verify(manager, token, user_id="u1", thread_id="t1"):
+    return asyncio.run(manager.verify(token, user_id, thread_id))
+
+
+def rejection(manager, token, user_id="u1", thread_id="t1") -> ThreadTokenError:
+    with pytest.raises(ThreadTokenError) as excinfo:
+        verify(manager, token, user_id, thread_id)
+    return excinfo.value
+
+
+def tamper(token, **changes):
+    payload, signature = token.split(".")
+    claims = json.loads(_b64decode(payload))
+    claims.update(changes)
+    return f"{_b64encode(json.dumps(claims).encode())}.{signature}"
+
+
+def test_issued_token_verifies(manager):
+    claims = verify(manager, manager.issue("u1", "t1"))
+    assert claims["user_id"] == "u1"
+    assert claims["thread_id"] == "t1"
+    assert claims["kid"] == "k2"
+
+
+def test_token_signed_with_an_older_key_still_verifies(session_factory, manager):
+    old = ThreadTokenManager(session_factory, mode="optional", keys="k1:old-secret")
+    verify(manager, old.issue("u1", "t1"))
+
+
+def test_tampered_payload_is_rejected(manager):
+    token = tamper(manager.issue("u1", "t1"), user_id="someone-else")
+    error = rejection(manager, token, user_id="someone-else")
+    assert error.status_code == 401
+    assert "signature" in str(error)
+
+
+def test_tampered_signature_is_rejected(manager):
+    payload, signature = manager.issue("u1", "t1").split(".")
+    flipped = ("A" if signature[0] != "A" else "B") + signature[1:]
+    assert rejection(manager, f"{payload}.{flipped}").status_code == 401
+
+
+@pytest.mark.parametrize("token", ["", "not-a-token", "a.b.c", f"{_b64encode(b'[1, 2]')}.sig"])
+def test_malformed_token_is_rejected(manager, token):
+    assert rejection(manager, token).status_code == 401
+
+
+def test_unknown_kid_is_rejected(session_factory, manager):
+    retired = ThreadTokenManager(session_factory, mode="optional", keys="k0:retired-secret")
+    error = rejection(manager, retired.issue("u1", "t1"))
+    assert error.status_code == 401
+    assert "unknown key" in str(error)
+
+
+def test_expired_token_is_rejected(session_factory):
+    manager = ThreadTokenManager(session_factory, mode="optional", keys="k1:secret", ttl_seconds=-1)
+    error = rejection(manager, manager.issue("u1", "t1"))
+    assert error.status_code == 401
+    assert "expired" in str(error)
+
+
+@pytest.mark.parametrize("user_id, thread_id", [("u2", "t1"), ("u1", "t2")])
+def test_user_or_thread_mismatch_is_forbidden(manager, user_id, thread_id):
+    assert rejection(manager, manager.issue("u1", "t1"), user_id, thread_id).status_code == 403
+
+
+def test_revocation_rejects_earlier_tokens_only(manager, monkeypatch):
+    token = manager.issue("u1", "t1")
+    other_thread = manager.issue("u1", "t2")
+    asyncio.run(manager.revoke("t1"))
+
+    error = rejection(manager, token)
+    assert error.status_code == 401
+    assert "revoked" in str(error)
+    verify(manager, other_thread, thread_id="t2")
+
+    # A token issued after the revocation is accepted again
+    later = time.time() + 5
+    monkeypatch.setattr(thread_tokens.time, "time", lambda: later)
+    verify(manager, manager.issue("u1", "t1"))
+
+
+def test_revocation_reaches_other_workers_through_the_deny_list(session_factory, manager):
+    other_worker = ThreadTokenManager(session_factory, mode="optional", keys="k2:new-secret", deny_list_ttl=0)
+    token = manager.issue("u1", "t1")
+    verify(other_worker, token)
+    asyncio.run(manager.revoke("t1"))
+    assert rejection(other_worker, token).status_code == 401
+
+
+def test_enabled_mode_needs_keys(session_factory):
+    with pytest.raises(ValueError):
+        ThreadTokenManager(session_factory, mode="required", keys="")
+    with pytest.raises(ValueError):
+        ThreadTokenManager(session_factory, mode="sometimes", keys="k1:secret")
+
+
+def test_thread_listing_reissues_tokens_for_existing_threads(monkeypatch):
+    from datetime import datetime
+    from fastapi.testclient import TestClient
+
+    import app as app_module
+    import thread_summaries
+
+    manager = ThreadTokenManager(app_module.SessionLocal, mode="required", keys="k1:secret", deny_list_ttl=0)
+    monkeypatch.setattr(app_module, "thread_token_manager", manager)
+    shard = app_module.router.shard_for("t-listed")
+    thread_summaries.Base.metadata.create_all(bind=shard.engine)
+    with shard.session() as db:
+        thread_summaries.record_turn(db, "u-listed", "t-listed", "question", datetime.utcnow())
+        db.commit()
+
+    response = TestClient(app_module.app).get("/users/u-listed/threads")
+    assert response.status_code == 200
+    [thread] = response.json()["threads"]
+    assert verify(manager, thread["thread_token"], "u-listed", "t-listed")["thread_id"] == "t-listed"
@@ -0,0 +1,29 @@
+import pytest
+
+from workflow_registry import WorkflowRegistry
+
+
+class FakeWorkflow:
+    def __init__(self):
+        self.compiled_graphs = {None: object()}
+
+
+def test_instances_are_created_once_per_name_and_key():
+    registry = WorkflowRegistry()
+    registry.register("flow", FakeWorkflow)
+
+    shared = registry.get("flow")
+    assert registry.get("flow") is shared
+    s0 = registry.get("flow", "s0")
+    assert s0 is not shared
+    assert registry.get("flow", "s0") is s0
+    assert registry.get("flow", "s1") is not s0
+
+    stats = registry.stats()
+    assert (stats["created"], stats["reused"]) == (3, 2)
+    assert stats["compiled_graphs"] == {"flow": 1, "flow[s0]": 1, "flow[s1]": 1}
+
+
+def test_unregistered_workflow_is_an_error():
+    with pytest.raises(KeyError):
+        WorkflowRegistry().get("missing")
@@ -0,0 +1,138 @@
+# Per-user thread listing backed by a maintained summary table.
+#
+# thread_summaries holds one row per thread (title = first question, turn count,
+# last activity), updated in the same transaction as each user_sessions insert,
+# so listing a user's threads is an index range scan on (user_id, last_activity)
+# instead of a GROUP BY over their whole history.
+
+import base64
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, String, Text, Integer, DateTime, Index, func, text, tuple_
+from sqlalchemy.orm import declarative_base, Session
+
+from storage import upsert
+
+TITLE_MAX_LENGTH = 120
+
+Base = declarative_base()
+
+
+class ThreadSummary(Base):
+    __tablename__ = "thread_summaries"
+    thread_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    title = Column(Text, nullable=True)
+    turn_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_activity = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_thread_summaries_user_last_activity", "user_id", "last_activity"),)
+
+
+def record_thread(db: Session, user_id: str, thread_id: str, timestamp: datetime):
+    """Register an empty thread. Caller commits."""
+    db.execute(upsert(db, ThreadSummary).values(
+        thread_id=thread_id,
+        user_id=user_id,
+        turn_count=0,
+        created_at=timestamp,
+        last_activity=timestamp,
+    ).on_conflict_do_nothing(index_elements=["thread_id"]))
+
+
+def record_turn(db: Session, user_id: str, thread_id: str, question: str, timestamp: datetime):
+    """Count a finished turn against its thread. Caller commits."""
+    statement = upsert(db, ThreadSummary).values(
+        thread_id=thread_id,
+        user_id=user_id,
+        title=question[:TITLE_MAX_LENGTH],
+        turn_count=1,
+        created_at=timestamp,
+        last_activity=timestamp,
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["thread_id"],
+        set_={
+            # The title stays the thread's first question
+            "title": func.coalesce(ThreadSummary.title, statement.excluded.title),
+            "turn_count": ThreadSummary.turn_count + 1,
+            "last_activity": statement.excluded.last_activity,
+        },
+    ))
+
+
+def encode_cursor(last_activity: datetime, thread_id: str) -> str:
+    raw = f"{last_activity.isoformat()}|{thread_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    last_activity, thread_id = raw.split("|", 1)
+    return datetime.fromisoformat(last_activity), thread_id
+
+
+def summary_to_dict(summary: ThreadSummary) -> Dict[str, Any]:
+    return {
+        "thread_id": summary.thread_id,
+        "title": summary.title,
+        "turn_count": summary.turn_count,
+        "created_at": summary.created_at,
+        "last_activity": summary.last_activity,
+    }
+
+
+def list_threads(db: Session, user_id: str, limit: int,
+                 after: Optional[Tuple[datetime, str]] = None) -> List[Dict[str, Any]]:
+    """Newest-first page of a user's threads, continuing after the ``after`` keyset position."""
+    query = db.query(ThreadSummary).filter(ThreadSummary.user_id == user_id)
+    if after is not None:
+        query = query.filter(
+            tuple_(ThreadSummary.last_activity, ThreadSummary.thread_id) < tuple_(*after)
+        )
+    rows = query.order_by(ThreadSummary.last_activity.desc(), ThreadSummary.thread_id.desc()).limit(limit).all()
+    return [summary_to_dict(row) for row in rows]
+
+
+# Portable between Postgres and SQLite
+BACKFILL_SQL = text(f"""
+    INSERT INTO thread_summaries (thread_id, user_id, title, turn_count, created_at, last_activity)
+    SELECT
+        s.thread_id,
+        min(s.user_id),
+        (SELECT substr(earliest.question, 1, {TITLE_MAX_LENGTH}) FROM user_sessions earliest
+         WHERE earliest.thread_id = s.thread_id AND earliest.question IS NOT NULL
+         ORDER BY earliest.timestamp LIMIT 1),
+        count(s.question),
+        min(s.timestamp),
+        max(s.timestamp)
+    FROM user_sessions s
+    WHERE s.thread_id NOT IN (SELECT thread_id FROM thread_summaries)
+    GROUP BY s.thread_id
+""")
+
+
+def backfill(engine) -> int:
+    """Build summaries for threads written before the table existed."""
+    with engine.begin() as connection:
+        return connection.execute(BACKFILL_SQL).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="thread_summaries maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    from app import router
+
+    if args.command == "backfill":
+        for shard in router.all():
+            Base.metadata.create_all(bind=shard.engine)
+            print(f"{shard.name}: {backfill(shard.engine)} thread(s) added")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Signed thread tokens: authorize /continue_session without a session lookup.
+#
+# With THREAD_TOKEN_MODE enabled, /new_session returns an HMAC-SHA256 token over
+# (user_id, thread_id, iat, exp, kid) and /continue_session checks it in-process
+# instead of querying user_sessions.
+#   off      - no tokens (default)
+#   optional - issue tokens; requests without one fall back to the lookup
+#   required - requests without a valid token are rejected
+#
+# Keys come from THREAD_TOKEN_KEYS="kid:secret,kid:secret". The first key signs,
+# all of them verify, so a key is rotated by putting the new one first and
+# dropping the old one once its tokens have expired. Revoking a thread's tokens
+# adds it to a small deny list in Postgres, cached per worker for
+# THREAD_TOKEN_DENY_LIST_TTL seconds.
+
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.orm import declarative_base
+
+logger = logging.getLogger(__name__)
+
+THREAD_TOKEN_MODE = os.getenv("THREAD_TOKEN_MODE", "off")
+THREAD_TOKEN_TTL_SECONDS = int(os.getenv("THREAD_TOKEN_TTL_SECONDS", str(30 * 24 * 3600)))
+THREAD_TOKEN_DENY_LIST_TTL = float(os.getenv("THREAD_TOKEN_DENY_LIST_TTL", "30"))
+
+MODES = ("off", "optional", "required")
+
+Base = declarative_base()
+
+
+class RevokedThread(Base):
+    __tablename__ = "revoked_thread_tokens"
+    thread_id = Column(String, primary_key=True)
+    revoked_at = Column(DateTime, nullable=False)
+    # Every token issued before revoked_at has expired by then
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ThreadTokenError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def parse_keys(raw: str) -> List[Tuple[str, bytes]]:
+    keys = []
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        kid, sep, secret = entry.partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError("THREAD_TOKEN_KEYS entries must look like kid:secret")
+        keys.append((kid, secret.encode("utf-8")))
+    return keys
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(secret: bytes, payload: str) -> str:
+    return _b64encode(hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+class ThreadTokenManager:
+    def __init__(self, session_factory, mode: str = THREAD_TOKEN_MODE, keys: Optional[str] = None,
+                 ttl_seconds: int = THREAD_TOKEN_TTL_SECONDS,
+                 deny_list_ttl: float = THREAD_TOKEN_DENY_LIST_TTL):
+        if mode not in MODES:
+            raise ValueError(f"THREAD_TOKEN_MODE must be one of {', '.join(MODES)}")
+        self.session_factory = session_factory
+        self.mode = mode
+        self.keys = parse_keys(keys if keys is not None else os.getenv("THREAD_TOKEN_KEYS", ""))
+        if self.enabled and not self.keys:
+            raise ValueError("THREAD_TOKEN_MODE is enabled but THREAD_TOKEN_KEYS is empty")
+        self.secrets = dict(self.keys)
+        self.ttl_seconds = ttl_seconds
+        self.deny_list_ttl = deny_list_ttl
+        self._revoked: Dict[str, float] = {}
+        self._revoked_loaded_at: Optional[float] = None
+        self._refresh_lock = asyncio.Lock()
+        self.counters = {
+            "issued": 0,
+            "verified": 0,
+            "rejected": 0,
+            "revoked_rejections": 0,
+            "deny_list_refreshes": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def required(self) -> bool:
+        return self.mode == "required"
+
+    def issue(self, user_id: str, thread_id: str) -> str:
+        kid, secret = self.keys[0]
+        now = int(time.time())
+        payload = _b64encode(json.dumps({
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "iat": now,
+            "exp": now + self.ttl_seconds,
+            "kid": kid,
+        }, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        self.counters["issued"] += 1
+        return f"{payload}.{_sign(secret, payload)}"
+
+    def _decode(self, token: str) -> Dict[str, Any]:
+        try:
+            payload, signature = token.split(".")
+            claims = json.loads(_b64decode(payload))
+            if not isinstance(claims, dict):
+                raise ValueError("claims must be an object")
+        except Exception:
+            raise ThreadTokenError(401, "Malformed thread token")
+        secret = self.secrets.get(claims.get("kid"))
+        if secret is None:
+            raise ThreadTokenError(401, "Thread token signed with an unknown key")
+        if not hmac.compare_digest(signature, _sign(secret, payload)):
+            raise ThreadTokenError(401, "Invalid thread token signature")
+        return claims
+
+    async def verify(self, token: str, user_id: str, thread_id: str) -> Dict[str, Any]:
+        """Return the token's claims, or raise ThreadTokenError. No database query unless the deny list is stale."""
+        try:
+            claims = self._decode(token)
+            if claims.get("exp", 0) < time.time():
+                raise ThreadTokenError(401, "Thread token expired")
+            if claims.get("user_id") != user_id or claims.get("thread_id") != thread_id:
+                raise ThreadTokenError(403, "Thread token does not match this user and thread")
+            await self._ensure_deny_list()
+            revoked_at = self._revoked.get(thread_id)
+            if revoked_at is not None and claims.get("iat", 0) <= revoked_at:
+                self.counters["revoked_rejections"] += 1
+                raise ThreadTokenError(401, "Thread token revoked")
+        except ThreadTokenError:
+            self.counters["rejected"] += 1
+            raise
+        self.counters["verified"] += 1
+        return claims
+
+    # Deny list
+    def _load_deny_list(self) -> Dict[str, float]:
+        db = self.session_factory()
+        try:
+            rows = db.query(RevokedThread).filter(RevokedThread.expires_at > datetime.utcnow()).all()
+            return {row.thread_id: _epoch(row.revoked_at) for row in rows}
+        finally:
+            db.close()
+
+    async def _ensure_deny_list(self):
+        if self._fresh():
+            return
+        async with self._refresh_lock:
+            if self._fresh():
+                return
+            try:
+                self._revoked = await asyncio.to_thread(self._load_deny_list)
+                self.counters["deny_list_refreshes"] += 1
+            except Exception as e:
+                # Keep serving with the last known list rather than failing every turn
+                logger.warning(f"Could not refresh thread token deny list: {e}")
+            self._revoked_loaded_at = time.monotonic()
+
+    def _fresh(self) -> bool:
+        return (self._revoked_loaded_at is not None
+                and time.monotonic() - self._revoked_loaded_at < self.deny_list_ttl)
+
+    def _revoke(self, thread_id: str) -> datetime:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            db.query(RevokedThread).filter(RevokedThread.expires_at <= now).delete()
+            db.merge(RevokedThread(
+                thread_id=thread_id,
+                revoked_at=now,
+                expires_at=now + timedelta(seconds=self.ttl_seconds),
+            ))
+            db.commit()
+            return now
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def revoke(self, thread_id: str):
+        """Invalidate every token issued so far for ``thread_id``.
+
+        Other workers pick this up within the deny-list TTL.
+        """
+        revoked_at = await asyncio.to_thread(self._revoke, thread_id)
+        self._revoked[thread_id] = _epoch(revoked_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "mode": self.mode,
+            "active_kid": self.keys[0][0] if self.keys else None,
+            "kids": [kid for kid, _ in self.keys],
+            "revoked_threads_cached": len(self._revoked),
+        }
+
+
+def _epoch(value: datetime) -> float:
+    # Timestamps are stored as naive UTC
+    return (value - datetime(1970, 1, 1)).total_seconds()
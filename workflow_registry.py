@@ -0,0 +1,67 @@
+# Per-worker registry of reusable workflow instances and cached prompts.
+#
+# Creating a workflow builds its LLM client and compiling a StateGraph walks the
+# whole graph, so each named workflow is created once per worker and shared by
+# every request. Workflows compile one graph per checkpointer and keep it.
+# Modules register their workflow class when imported:
+#   registry.register("chatbotflow", Chatbotflow)
+#   flow = registry.get("chatbotflow")
+# A workflow holds one active checkpointer, so callers that need several (one
+# per shard) ask for one instance per key:
+#   flow = registry.get("chatbotflow", shard.name)
+
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.messages import SystemMessage
+
+# Prepended to every LLM call; never stored in the checkpoint
+CHATBOT_SYSTEM_PROMPT = os.getenv("CHATBOT_SYSTEM_PROMPT", "")
+
+
+class WorkflowRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[Tuple[str, Optional[str]], Any] = {}
+        self.counters = {"created": 0, "reused": 0}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str, key: Optional[str] = None) -> Any:
+        """The worker's shared instance of workflow ``name`` for ``key``, created on first use."""
+        instance_key = (name, key)
+        if instance_key in self._instances:
+            self.counters["reused"] += 1
+            return self._instances[instance_key]
+        if name not in self._factories:
+            raise KeyError(f"No workflow registered as {name!r}")
+        self._instances[instance_key] = self._factories[name]()
+        self.counters["created"] += 1
+        return self._instances[instance_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "registered": sorted(self._factories),
+            "compiled_graphs": {
+                (name if key is None else f"{name}[{key}]"): len(getattr(instance, "compiled_graphs", {}))
+                for (name, key), instance in self._instances.items()
+            },
+        }
+
+
+registry = WorkflowRegistry()
+
+
+@lru_cache(maxsize=None)
+def system_message(prompt: Optional[str] = None) -> Optional[SystemMessage]:
+    """The SystemMessage for ``prompt`` (CHATBOT_SYSTEM_PROMPT by default), built once."""
+    prompt = CHATBOT_SYSTEM_PROMPT if prompt is None else prompt
+    return SystemMessage(content=prompt) if prompt else None
+
+
+def with_system_message(messages: list) -> list:
+    system = system_message()
+    return [system, *messages] if system is not None else messages